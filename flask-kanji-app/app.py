@@ -1,14 +1,28 @@
-from flask import Flask, render_template, request, jsonify, session, send_file, redirect, url_for
-import random
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, Response, stream_with_context, g, abort
+import copy
 import json
+import math
 import os
-import re
+import time
 import csv
-from io import BytesIO, StringIO
-# PDF functionality temporarily disabled
+import functools
+import hashlib
+import zlib
+from datetime import date
+from io import StringIO
+from urllib.parse import quote
 import warnings
-from database import init_db, create_user, authenticate_user, get_user_settings, save_user_settings, get_progress, save_progress, delete_progress_item, reset_progress, get_user_stats, get_current_session_id
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from password_hashing import HasherBusy
+from database import PoolTimeout
+from database import init_db, create_user, authenticate_user, get_user_settings, save_user_settings, get_progress, save_progress, delete_progress_item, reset_progress, get_user_stats, get_current_session_id, get_review_cards, save_progress_batch, iter_progress_rows, get_progress_version, get_settings_version
 import uuid
+from catalog import get_catalog
+from session_store import create_session_store
+from sampler import UnseenPool
+from search_index import get_search_index, MAX_RESULTS
+import pdf_export
+import metrics
 
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', 'fallback-secret-key-change-in-production')
@@ -20,30 +34,90 @@ init_db()
 
 # Configuration
 TXT_FILE_PATH = "japanese_characters.txt"
+# Most cards one /get_character?count=N call may reserve
+MAX_PREFETCH = 20
+# Bytes of CSV buffered before a chunk is sent
+CSV_CHUNK_SIZE = 64 * 1024
+# When set, /metrics requires an "Authorization: Bearer <token>" header
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+# JSON responses at least this many bytes are gzipped for clients that accept it; negative turns it off
+COMPRESS_MIN_BYTES = int(os.environ.get('COMPRESS_MIN_BYTES', 1024))
+
+# Server-side quiz state; the cookie only carries quiz_key, num_chars and quiz_direction
+session_store = create_session_store()
+pdf_exporter = pdf_export.PdfExporter() if pdf_export.available() else None
+# Build the search index now rather than on the first query
+get_search_index(get_catalog(TXT_FILE_PATH))
 
 def load_numbers_from_file(file_path, num_rows):
-    characters = []
+    # Served from the process-wide catalog; the file is only re-read when it changes
+    return get_catalog(file_path).first(num_rows)
+
+def empty_quiz_state():
+    return {'selected_characters': {}, 'session_id': None, 'question_start_time': None}
+
+def load_quiz_state():
+    key = session.get('quiz_key')
+    state = session_store.get(key) if key else None
+    return state if state is not None else empty_quiz_state()
+
+def current_quiz_key():
+    if 'quiz_key' not in session:
+        session['quiz_key'] = uuid.uuid4().hex
+    return session['quiz_key']
+
+def save_quiz_state(state):
+    # Changes on every save, so /get_progress can tell whether the state moved on
+    state['revision'] = uuid.uuid4().hex
+    session_store.set(current_quiz_key(), state)
+
+def change_quiz_state(key, change, *args):
+    """Run change(state, *args) on the stored quiz state and save it in one atomic step; returns its result.
+
+    Requests for the same quiz, such as /answers and a prefetch sent together, run
+    one after another instead of overwriting each other's changes.
+    """
+    def apply(state):
+        if state is None:
+            state = empty_quiz_state()
+        result = change(state, *args)
+        state['revision'] = uuid.uuid4().hex
+        return state, result
+    return session_store.update(key, apply)
+
+def update_quiz_state(change, *args):
+    return change_quiz_state(current_quiz_key(), change, *args)
+
+def deck_pool(state, num_chars):
+    """Unseen-character pool for the current deck, rebuilt if the catalog changed since it was saved"""
+    catalog = get_catalog(TXT_FILE_PATH)
+    catalog.refresh()
+    deck_size = catalog.count_upto(num_chars)
+    pool_data = state.get('pool')
+    reusable = bool(pool_data) and pool_data['deck_size'] == deck_size and state.get('catalog_digest') == catalog.digest
+    metrics.cache_lookup('quiz_pool', reusable)
+    if reusable:
+        return catalog, UnseenPool.from_dict(pool_data)
+    
+    pool = UnseenPool(deck_size)
+    for char in state['selected_characters']:
+        index = catalog.index_of(char)
+        if index is not None:
+            pool.remove(index)
+    state['catalog_digest'] = catalog.digest
+    return catalog, pool
+
+def take_answer_time(state, character, client_time_ms=None):
+    """Answer time for character: the client's own measurement, else the time since it was issued"""
+    issued_at = state.setdefault('reserved', {}).pop(character, None)
     try:
-        with open(file_path, "r", encoding="utf-8") as file:
-            for i, line in enumerate(file):
-                if i >= num_rows:
-                    break
-                match = re.search(r'^(.+?)\s+"[^"]*\s+([^\s]+)\s+Lesson:', line)
-                if match:
-                    meaning = match.group(1).strip()
-                    character = match.group(2).strip()
-                    characters.append((i + 1, character, meaning))
-    except Exception as e:
-        print(f"Error reading file: {e}")
-    return characters
-
-
-
-def select_random_character(available_characters, selected_characters):
-    remaining_characters = [char for _, char, _ in available_characters if char not in selected_characters]
-    if not remaining_characters:
-        return None
-    return random.choice(remaining_characters)
+        client_time_ms = float(client_time_ms)
+    except (TypeError, ValueError):
+        client_time_ms = None
+    if client_time_ms is not None and math.isfinite(client_time_ms):
+        return max(int(client_time_ms), 0)
+    start_time = issued_at or state.get('question_start_time')
+    return int(time.time() * 1000) - start_time if start_time else 0
 
 def calculate_score(selected_characters):
     if not selected_characters:
@@ -52,12 +126,73 @@ def calculate_score(selected_characters):
     correct = sum(selected_characters.values())
     return round((correct / total) * 100, 2)
 
+def make_etag(*parts):
+    """Validator for a response that is fully determined by parts"""
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()[:20]
+
+def tag_response(response, etag):
+    # Weak, since the same JSON may go out gzipped or not
+    response.set_etag(etag, weak=True)
+    # Browsers keep the body but revalidate it before every use
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.update(('Cookie', 'Accept-Encoding'))
+    return response
+
+def conditional_json(etag, build):
+    """304 if the client already holds etag, else build() as JSON; build only runs on a miss"""
+    if request.if_none_match.contains_weak(etag):
+        return tag_response(Response(status=304), etag)
+    return tag_response(jsonify(build()), etag)
+
+def compress_json(response, body, accept_encodings):
+    """Gzip a buffered JSON response in place if it is large enough and the client accepts gzip"""
+    response.vary.add('Accept-Encoding')
+    if (COMPRESS_MIN_BYTES < 0 or len(body) < COMPRESS_MIN_BYTES or response.status_code != 200
+            or 'Content-Encoding' in response.headers or not accept_encodings['gzip']):
+        return
+    response.set_data(b''.join(gzip_chunks([body])))
+    response.headers['Content-Encoding'] = 'gzip'
+
+@app.before_request
+def start_timer():
+    g.request_started = time.perf_counter()
+    cookie = request.cookies.get(app.config['SESSION_COOKIE_NAME'])
+    if cookie:
+        metrics.session_cookie_bytes.observe(len(cookie))
+
+@app.after_request
+def record_request(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        endpoint = request.endpoint or 'unmatched'
+        metrics.request_seconds.observe(time.perf_counter() - started, endpoint)
+        metrics.requests_total.inc(endpoint, request.method, str(response.status_code))
+    return response
+
+@app.after_request
+def compress_response(response):
+    if response.mimetype == 'application/json' and not response.is_streamed:
+        compress_json(response, response.get_data(), request.accept_encodings)
+    return response
+
 @app.route('/')
 def index():
     if 'username' not in session:
         return redirect(url_for('login'))
     return render_template('index.html')
 
+def busy_response():
+    response = jsonify({'success': False, 'message': 'Too many logins right now, please try again'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+@app.errorhandler(PoolTimeout)
+def database_busy(e):
+    print(f"Error acquiring a database connection: {e}")
+    response = jsonify({'error': 'The server is busy, please try again'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
@@ -65,7 +200,11 @@ def login():
         username = data.get('username')
         password = data.get('password')
         
-        if authenticate_user(username, password):
+        try:
+            authenticated = authenticate_user(username, password)
+        except HasherBusy:
+            return busy_response()
+        if authenticated:
             session['username'] = username
             return jsonify({'success': True})
         return jsonify({'success': False, 'message': 'Invalid credentials'})
@@ -79,7 +218,11 @@ def register():
         username = data.get('username')
         password = data.get('password')
         
-        if create_user(username, password):
+        try:
+            created = create_user(username, password)
+        except HasherBusy:
+            return busy_response()
+        if created:
             return jsonify({'success': True})
         return jsonify({'success': False, 'message': 'Username already exists'})
     
@@ -88,6 +231,9 @@ def register():
 @app.route('/logout')
 def logout():
     session.pop('username', None)
+    quiz_key = session.pop('quiz_key', None)
+    if quiz_key:
+        session_store.delete(quiz_key)
     return redirect(url_for('login'))
 
 @app.route('/start_game', methods=['POST'])
@@ -100,81 +246,262 @@ def start_game():
     
     # Load saved num_chars or use provided/default
     saved_num_chars = get_user_settings(username)
-    num_chars = data.get('num_chars', saved_num_chars)
+    num_chars = parse_num_chars(data.get('num_chars'), saved_num_chars or 2200)
+    if num_chars is None:
+        return jsonify({'error': 'num_chars must be a positive whole number'}), 400
     direction = data.get('direction', 'Japanese → English')
+    # 'learn' draws unseen characters, 'review' serves spaced-repetition cards as they fall due
+    mode = 'review' if data.get('mode') == 'review' else 'learn'
     
     save_user_settings(username, num_chars)
     
-    available_characters = load_numbers_from_file(TXT_FILE_PATH, num_chars)
     selected_characters = get_progress(username, direction)
     
-    session['available_characters'] = available_characters
-    session['selected_characters'] = selected_characters
+    old_quiz_key = session.pop('quiz_key', None)
+    if old_quiz_key:
+        session_store.delete(old_quiz_key)
     session['quiz_direction'] = direction
     session['num_chars'] = num_chars
-    session['session_id'] = str(uuid.uuid4())
-    session['question_start_time'] = None
+    save_quiz_state(new_quiz_state(selected_characters, mode, num_chars))
     
     return get_next_character()
 
+def parse_num_chars(value, default):
+    """Deck size from a request as a positive int, default when it is missing; None if it is invalid"""
+    if value is None:
+        value = default
+    if isinstance(value, bool):
+        return None
+    try:
+        num_chars = int(value)
+    except (TypeError, ValueError):
+        return None
+    return num_chars if num_chars > 0 else None
+
+def new_quiz_state(selected_characters, mode, num_chars):
+    state = {
+        'selected_characters': selected_characters,
+        'session_id': str(uuid.uuid4()),
+        'question_start_time': None,
+        'mode': mode
+    }
+    catalog, pool = deck_pool(state, num_chars)
+    state['pool'] = pool.to_dict()
+    return state
+
+def take_cards(state, num_chars, count, direction, load_review_cards=None):
+    """Reserve the next count cards so later prefetch windows never repeat them.
+
+    In review mode load_review_cards(limit) returns the user's (character, due_at) cards, soonest first.
+    """
+    catalog, pool = deck_pool(state, num_chars)
+    reserved = state.setdefault('reserved', {})
+    now_ms = int(time.time() * 1000)
+    entries = []
+    next_review_at = None
+    
+    if state.get('mode') == 'review':
+        for character, due_at in load_review_cards(count + len(reserved)):
+            if len(entries) == count:
+                break
+            if character in reserved:
+                continue
+            if due_at > now_ms / 1000:
+                next_review_at = due_at
+                break
+            entries.append(catalog.by_character(character) or (None, character, "No meaning found"))
+    else:
+        for _ in range(count):
+            index = pool.draw()
+            if index is None:
+                break
+            # Reserved cards leave the pool; answering keeps them out, undo puts them back
+            pool.remove(index)
+            entries.append(catalog.entry(index))
+    
+    for _, char, _ in entries:
+        reserved[char] = now_ms
+    state['pool'] = pool.to_dict()
+    
+    result = {
+        'cards': [{'char_number': n, 'character': c, 'meaning': m, 'direction': direction} for n, c, m in entries],
+        'direction': direction,
+        'no_more_characters': not entries and not reserved
+    }
+    if state.get('mode') == 'review':
+        result['next_review_at'] = next_review_at
+    return result
+
+def draw_card(state, catalog, pool):
+    # The card on screen is held out of the pool so prefetching cannot repeat it;
+    # drawing a new one without answering returns the previous card to the pool
+    held = state.pop('held_index', None)
+    if held is not None and held < len(catalog) and catalog.characters[held] not in state['selected_characters']:
+        pool.add(held)
+    index = pool.draw()
+    if index is None:
+        return None
+    pool.remove(index)
+    state['held_index'] = index
+    return catalog.entry(index)
+
+def issue_card(state, num_chars, direction, load_review_cards=None):
+    """The next card to show, or a no_more_characters reply"""
+    if state.get('mode') == 'review':
+        # Reserved like a prefetched card, so the first prefetch window cannot serve it again
+        result = take_cards(state, num_chars, 1, direction, load_review_cards)
+        if not result['cards']:
+            return {'no_more_characters': True, 'next_review_at': result['next_review_at']}
+        state['question_start_time'] = int(time.time() * 1000)
+        return result['cards'][0]
+    
+    catalog, pool = deck_pool(state, num_chars)
+    entry = draw_card(state, catalog, pool)
+    state['pool'] = pool.to_dict()
+    if entry is None:
+        return {'no_more_characters': True}
+    char_number, char, meaning = entry
+    
+    state['question_start_time'] = int(time.time() * 1000)
+    return {
+        'char_number': char_number,
+        'character': char,
+        'meaning': meaning,
+        'direction': direction
+    }
+
+def valid_time_ms(value):
+    # JSON allows NaN and Infinity, and bool is a subclass of int
+    return value is None or (type(value) in (int, float) and math.isfinite(value) and value >= 0)
+
+def valid_answer(answer):
+    """Whether an /answer or /answers entry is a known character with the types record_answers relies on"""
+    return (isinstance(answer, dict)
+            and isinstance(answer.get('character'), str)
+            and get_catalog(TXT_FILE_PATH).index_of(answer['character']) is not None
+            and answer.get('is_correct', False) in (True, False)  # a boolean, or 0/1
+            and valid_time_ms(answer.get('answer_time_ms'))
+            and isinstance(answer.get('client_seq'), (int, type(None))))
+
+def record_answers(state, num_chars, answers):
+    """Mark (character, correct, client_time_ms) answers as seen.
+
+    Returns the quiz's session_id and the (character, correct, answer_time_ms) rows to save.
+    """
+    rows = [(character, correct, take_answer_time(state, character, client_time_ms))
+            for character, correct, client_time_ms in answers]
+    catalog, pool = deck_pool(state, num_chars)
+    for character, correct, _ in rows:
+        state['selected_characters'][character] = correct
+        index = catalog.index_of(character)
+        if index is not None:
+            pool.remove(index)
+    state['pool'] = pool.to_dict()
+    return state['session_id'], rows
+
+def preview_answers(state, num_chars, answers):
+    """What record_answers would return, leaving state untouched.
+
+    Progress is saved from this before the quiz state is updated, so a failed database
+    write leaves the quiz as it was instead of marking unsaved answers as seen.
+    """
+    return record_answers(copy.deepcopy(state), num_chars, answers)
+
+def undo_recorded_answer(state, num_chars, character):
+    """Put an answered character back in the deck; False if it was never answered"""
+    if character not in state['selected_characters']:
+        return False
+    del state['selected_characters'][character]
+    catalog, pool = deck_pool(state, num_chars)
+    index = catalog.index_of(character)
+    if index is not None:
+        pool.add(index)
+    state['pool'] = pool.to_dict()
+    return True
+
+def clear_answers(state, num_chars):
+    state['selected_characters'] = {}
+    state['reserved'] = {}
+    catalog, pool = deck_pool(state, num_chars)
+    pool.reset()
+    state['pool'] = pool.to_dict()
+
 @app.route('/get_character')
 def get_next_character():
     if 'username' not in session:
         return jsonify({'error': 'Not authenticated'}), 401
     
-    available_characters = session.get('available_characters', [])
-    selected_characters = session.get('selected_characters', {})
-    
-    selected = select_random_character(available_characters, selected_characters)
-    if not selected:
-        return jsonify({'no_more_characters': True})
-    
-    char_number, char, meaning = next((n, c, m) for n, c, m in available_characters if c == selected)
-    
-    import time
-    session['question_start_time'] = int(time.time() * 1000)
-    
-    return jsonify({
-        'char_number': char_number,
-        'character': char,
-        'meaning': meaning,
-        'direction': session.get('quiz_direction', 'Japanese → English')
-    })
+    direction = session.get('quiz_direction', 'Japanese → English')
+    num_chars = session.get('num_chars', 0)
+    load_review_cards = functools.partial(get_review_cards, session['username'], direction)
+    count = request.args.get('count', type=int)
+    if count is not None:
+        count = min(max(count, 1), MAX_PREFETCH)
+        return jsonify(update_quiz_state(take_cards, num_chars, count, direction, load_review_cards))
+    
+    return jsonify(update_quiz_state(issue_card, num_chars, direction, load_review_cards))
 
 @app.route('/answer', methods=['POST'])
 def answer():
     if 'username' not in session:
         return jsonify({'error': 'Not authenticated'}), 401
     
-    data = request.get_json()
-    character = data.get('character')
-    is_correct = data.get('is_correct')
+    data = request.get_json(silent=True) or {}
+    if not valid_answer(data):
+        return jsonify({'error': 'answer must be {character, is_correct, answer_time_ms}'}), 400
+    character = data['character']
     
     username = session['username']
-    direction = session.get('quiz_direction')
-    session_id = session.get('session_id')
-    start_time = session.get('question_start_time', 0)
+    direction = session.get('quiz_direction', 'Japanese → English')
+    num_chars = session.get('num_chars', 0)
+    answers = [(character, 1 if data.get('is_correct') else 0, data.get('answer_time_ms'))]
+    session_id, [(_, correct, answer_time)] = preview_answers(load_quiz_state(), num_chars, answers)
     
-    import time
-    answer_time = int(time.time() * 1000) - start_time if start_time else 0
+    save_progress(username, character, direction, correct, answer_time, session_id)
+    update_quiz_state(record_answers, num_chars, answers)
     
-    selected_characters = session.get('selected_characters', {})
-    selected_characters[character] = 1 if is_correct else 0
-    session['selected_characters'] = selected_characters
+    return jsonify({'success': True, 'character': character})
+
+@app.route('/answers', methods=['POST'])
+def submit_answers():
+    if 'username' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
     
-    save_progress(username, character, direction, 1 if is_correct else 0, answer_time, session_id)
+    data = request.get_json(silent=True) or {}
+    answers = data.get('answers')
+    if not isinstance(answers, list) or not all(valid_answer(a) for a in answers):
+        return jsonify({'error': 'answers must be a list of {character, is_correct, answer_time_ms, client_seq}'}), 400
     
-    return jsonify({'success': True, 'character': character})
+    # Retried batches carry the same key and are applied only once
+    idempotency_key = request.headers.get('Idempotency-Key') or data.get('batch_id')
+    answers = sorted(answers, key=lambda a: a.get('client_seq') or 0)
+    
+    username = session['username']
+    direction = session.get('quiz_direction', 'Japanese → English')
+    num_chars = session.get('num_chars', 0)
+    answers = [(a['character'], 1 if a.get('is_correct') else 0, a.get('answer_time_ms')) for a in answers]
+    session_id, rows = preview_answers(load_quiz_state(), num_chars, answers)
+    
+    applied = save_progress_batch(username, direction, session_id, rows, idempotency_key)
+    # Recording answers in the quiz state is idempotent, so a retried batch is harmless there
+    update_quiz_state(record_answers, num_chars, answers)
+    
+    return jsonify({'success': True, 'applied': applied, 'count': len(rows)})
 
 @app.route('/get_progress')
 def get_progress_route():
     if 'username' not in session:
         return jsonify({'error': 'Not authenticated'}), 401
     
-    available_characters = session.get('available_characters', [])
-    selected_characters = session.get('selected_characters', {})
-    
-    total_characters = len(available_characters)
+    state = load_quiz_state()
+    num_chars = session.get('num_chars', 0)
+    etag = make_etag('progress', session['username'], session.get('quiz_key'), state.get('revision'), num_chars,
+                     get_catalog(TXT_FILE_PATH).digest)
+    return conditional_json(etag, lambda: progress_summary(state['selected_characters'], num_chars))
+
+def progress_summary(selected_characters, num_chars):
+    catalog = get_catalog(TXT_FILE_PATH)
+    total_characters = catalog.count_upto(num_chars)
     shown_characters = len(selected_characters)
     progress_percentage = (shown_characters / total_characters * 100) if total_characters > 0 else 0
     score_percentage = calculate_score(selected_characters)
@@ -182,16 +509,17 @@ def get_progress_route():
     incorrect_characters = []
     for char, score in selected_characters.items():
         if score == 0:
-            meaning = next((m for _, c, m in available_characters if c == char), "No meaning found")
+            entry = catalog.by_character(char)
+            meaning = entry[2] if entry else "No meaning found"
             incorrect_characters.append({'character': char, 'meaning': meaning})
     
-    return jsonify({
+    return {
         'total_characters': total_characters,
         'shown_characters': shown_characters,
         'progress_percentage': round(progress_percentage, 2),
         'score_percentage': score_percentage,
         'incorrect_characters': incorrect_characters
-    })
+    }
 
 @app.route('/undo_answer', methods=['POST'])
 def undo_answer():
@@ -202,12 +530,9 @@ def undo_answer():
     character = data.get('character')
     
     username = session['username']
-    direction = session.get('quiz_direction')
-    selected_characters = session.get('selected_characters', {})
+    direction = session.get('quiz_direction', 'Japanese → English')
     
-    if character in selected_characters:
-        del selected_characters[character]
-        session['selected_characters'] = selected_characters
+    if update_quiz_state(undo_recorded_answer, session.get('num_chars', 0), character):
         delete_progress_item(username, character, direction)
         return jsonify({'success': True})
     
@@ -220,11 +545,10 @@ def get_user_settings_route():
     
     username = session['username']
     from database import get_user_settings as db_get_user_settings
-    saved_num_chars = db_get_user_settings(username)
     
-    return jsonify({
+    return conditional_json(make_etag('settings', username, get_settings_version(username)), lambda: {
         'username': username,
-        'saved_num_chars': saved_num_chars or 2200
+        'saved_num_chars': db_get_user_settings(username) or 2200
     })
 
 @app.route('/reset_progress', methods=['POST'])
@@ -235,38 +559,141 @@ def reset_progress_route():
     username = session['username']
     direction = session.get('quiz_direction', 'Japanese → English')
     
-    session['selected_characters'] = {}
+    update_quiz_state(clear_answers, session.get('num_chars', 0))
     from database import reset_progress as db_reset_progress
     db_reset_progress(username, direction)
     
     return jsonify({'success': True})
 
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(wbits=31)  # 31 selects the gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+def parse_date_range(start_date, end_date):
+    """Error message if start or end is not a YYYY-MM-DD date, else None"""
+    try:
+        for value in (start_date, end_date):
+            if value:
+                date.fromisoformat(value)
+    except ValueError:
+        return 'start and end must be YYYY-MM-DD dates'
+    return None
+
+def csv_chunks(username, direction, session_id, start_date, end_date):
+    catalog = get_catalog(TXT_FILE_PATH)
+    output = StringIO()
+    writer = csv.writer(output)
+    writer.writerow(["Character Number", "Character", "Meaning", "Status", "Direction", "Answer Time (ms)", "Session", "Answered At"])
+    for row in iter_progress_rows(username, direction, session_id, start_date, end_date):
+        entry = catalog.by_character(row['character'])
+        status = "Correct" if row['correct'] == 1 else "Incorrect"
+        writer.writerow([entry[0] if entry else "", row['character'], entry[2] if entry else "", status,
+                         row['direction'], row['answer_time_ms'], row['session_id'], row['answered_at']])
+        if output.tell() >= CSV_CHUNK_SIZE:
+            yield output.getvalue().encode('utf-8')
+            output.seek(0)
+            output.truncate()
+    yield output.getvalue().encode('utf-8')
+
 @app.route('/download_csv')
 def download_csv():
     if 'username' not in session:
         return jsonify({'error': 'Not authenticated'}), 401
     
-    available_characters = session.get('available_characters', [])
-    selected_characters = session.get('selected_characters', {})
     username = session['username']
+    direction = request.args.get('direction')
+    session_id = request.args.get('session_id')
+    if session_id == 'current':
+        session_id = load_quiz_state()['session_id']
+    start_date = request.args.get('start')
+    end_date = request.args.get('end')
+    error = parse_date_range(start_date, end_date)
+    if error:
+        return jsonify({'error': error}), 400
+    use_gzip = request.args.get('gzip') == '1'
+    
+    body = csv_chunks(username, direction, session_id, start_date, end_date)
+    filename = f"{username}-japanese_characters.csv"
+    mimetype = 'text/csv'
+    if use_gzip:
+        body = gzip_chunks(body)
+        filename += '.gz'
+        mimetype = 'application/gzip'
+    
+    return Response(stream_with_context(body), mimetype=mimetype,
+                    headers={'Content-Disposition': f"attachment; filename*=UTF-8''{quote(filename)}"})
+
+def pdf_rows(username, direction):
+    catalog = get_catalog(TXT_FILE_PATH)
+    rows = []
+    for char, correct in get_progress(username, direction).items():
+        entry = catalog.by_character(char)
+        if entry:
+            rows.append((entry[0], char, entry[2], correct))
+    rows.sort()
+    return rows
+
+@app.route('/download_pdf')
+def download_pdf():
+    if 'username' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    if pdf_exporter is None:
+        return jsonify({'error': 'PDF export requires reportlab'}), 503
     
-    output = StringIO()
-    writer = csv.writer(output)
-    writer.writerow(["Character Number", "Character", "Meaning", "Status"])
-    
-    for char_number, char, meaning in available_characters:
-        if char in selected_characters:
-            status = "Correct" if selected_characters[char] == 1 else "Incorrect"
-            writer.writerow([char_number, char, meaning, status])
+    username = session['username']
+    direction = request.args.get('direction') or session.get('quiz_direction', 'Japanese → English')
+    catalog = get_catalog(TXT_FILE_PATH)
+    catalog.refresh()
+    key = (username, direction, get_progress_version(username), catalog.digest)
+    
+    load_rows = functools.partial(pdf_rows, username, direction)
+    document, future = pdf_exporter.get(key, load_rows)
+    if document is None:
+        try:
+            document = future.result(timeout=pdf_export.PDF_WAIT_SECONDS)
+        except FutureTimeoutError:
+            response = jsonify({'status': 'rendering'})
+            response.headers['Retry-After'] = '2'
+            return response, 202
+        except Exception as e:
+            print(f"Error rendering PDF: {e}")
+            return jsonify({'error': 'Failed to render PDF'}), 500
+    
+    filename = f"{username}-japanese_characters.pdf"
+    return Response(pdf_exporter.iter_document(key, document, load_rows), mimetype='application/pdf',
+                    headers={'Content-Disposition': f"attachment; filename*=UTF-8''{quote(filename)}"})
+
+@app.route('/search')
+def search():
+    if 'username' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
     
-    csv_data = output.getvalue().encode('utf-8')
-    output.close()
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'q is required'}), 400
+    try:
+        limit = min(max(int(request.args.get('limit', 20)), 1), MAX_RESULTS)
+    except ValueError:
+        return jsonify({'error': 'limit must be a number'}), 400
     
-    return send_file(BytesIO(csv_data), as_attachment=True, download_name=f"{username}-japanese_characters.csv", mimetype='text/csv')
+    etag = make_etag('search', get_catalog(TXT_FILE_PATH).digest, query, limit)
+    return conditional_json(etag, lambda: {'query': query, 'results': search_results(query, limit)})
 
-@app.route('/download_pdf')
-def download_pdf():
-    return jsonify({'error': 'PDF download temporarily disabled'}), 503
+def search_results(query, limit):
+    index = get_search_index(get_catalog(TXT_FILE_PATH))
+    return [{
+        'number': record.number,
+        'character': record.character,
+        'meaning': record.meaning,
+        'on_yomi': record.on_yomi,
+        'kun_yomi': record.kun_yomi,
+        'constituents': record.constituents,
+        'score': score
+    } for record, score in index.search(query, limit)]
 
 @app.route('/stats')
 def stats():
@@ -285,10 +712,18 @@ def api_stats():
     
     # Get current session if requested
     if session_id == 'current':
-        session_id = session.get('session_id')
+        session_id = load_quiz_state()['session_id']
     
-    stats = get_user_stats(username, direction, session_id)
-    return jsonify(stats)
+    # Stats only change with the progress version, the filters and the day
+    etag = make_etag('stats', username, direction, session_id, get_progress_version(username),
+                     int(time.time()) // 86400)
+    return conditional_json(etag, lambda: get_user_stats(username, direction, session_id))
+
+@app.route('/metrics')
+def metrics_route():
+    if METRICS_TOKEN and request.headers.get('Authorization') != f"Bearer {METRICS_TOKEN}":
+        abort(401)
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
 
 if __name__ == '__main__':
     import os
@@ -0,0 +1,405 @@
+"""Asyncio serving mode: the quiz API on Quart, served by hypercorn.
+
+Routes, JSON shapes and the session cookie match app.py, whose state (catalog,
+quiz session store, PDF exporter, search index) and request-independent helpers,
+including every change to the quiz state, are reused. Database and session store
+calls go through AsyncDatabase, with writes on its writer thread, so a request
+waiting on SQLite or bcrypt no longer occupies a worker thread.
+
+    hypercorn asgi_app:app --bind 0.0.0.0:5000
+"""
+import asyncio
+import functools
+import inspect
+import os
+import time
+import uuid
+from urllib.parse import quote
+
+from quart import Quart, render_template, request, jsonify, session, redirect, url_for, Response, g, abort
+
+import app as sync_app
+import database
+import metrics
+import pdf_export
+from app import (TXT_FILE_PATH, MAX_PREFETCH, METRICS_TOKEN, session_store, pdf_exporter, empty_quiz_state,
+                 change_quiz_state, parse_num_chars, new_quiz_state, take_cards, issue_card, valid_answer,
+                 record_answers, preview_answers, undo_recorded_answer, clear_answers, progress_summary,
+                 parse_date_range, csv_chunks, gzip_chunks, pdf_rows, search_results, make_etag, tag_response,
+                 compress_json)
+from async_db import AsyncDatabase
+from catalog import get_catalog
+from database import PoolTimeout
+from password_hashing import HasherBusy
+from search_index import MAX_RESULTS
+
+app = Quart(__name__)
+app.secret_key = sync_app.app.secret_key
+
+db = AsyncDatabase()
+
+
+async def load_quiz_state():
+    key = session.get('quiz_key')
+    state = await db.run_read(session_store.get, key) if key else None
+    return state if state is not None else empty_quiz_state()
+
+def current_quiz_key():
+    if 'quiz_key' not in session:
+        session['quiz_key'] = uuid.uuid4().hex
+    return session['quiz_key']
+
+async def save_quiz_state(state):
+    state['revision'] = uuid.uuid4().hex
+    await db.run_write(session_store.set, current_quiz_key(), state)
+
+async def update_quiz_state(change, *args):
+    # The whole read-change-write runs on the writer thread, so change may call database.py directly
+    return await db.run_write(change_quiz_state, current_quiz_key(), change, *args)
+
+def not_authenticated():
+    return jsonify({'error': 'Not authenticated'}), 401
+
+async def conditional_json(etag, build):
+    """304 if the client already holds etag, else build() as JSON; build may return an awaitable"""
+    if request.if_none_match.contains_weak(etag):
+        return tag_response(Response(status=304), etag)
+    data = build()
+    if inspect.isawaitable(data):
+        data = await data
+    return tag_response(jsonify(data), etag)
+
+def attachment(body, filename, mimetype):
+    return Response(body, mimetype=mimetype,
+                    headers={'Content-Disposition': f"attachment; filename*=UTF-8''{quote(filename)}"})
+
+@app.before_request
+async def start_timer():
+    g.request_started = time.perf_counter()
+    cookie = request.cookies.get(app.config['SESSION_COOKIE_NAME'])
+    if cookie:
+        metrics.session_cookie_bytes.observe(len(cookie))
+
+@app.after_request
+async def record_request(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        endpoint = request.endpoint or 'unmatched'
+        metrics.request_seconds.observe(time.perf_counter() - started, endpoint)
+        metrics.requests_total.inc(endpoint, request.method, str(response.status_code))
+    return response
+
+@app.after_request
+async def compress_response(response):
+    if response.mimetype == 'application/json':
+        compress_json(response, await response.get_data(), request.accept_encodings)
+    return response
+
+@app.route('/')
+async def index():
+    if 'username' not in session:
+        return redirect(url_for('login'))
+    return await render_template('index.html')
+
+def busy_response():
+    response = jsonify({'success': False, 'message': 'Too many logins right now, please try again'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+@app.errorhandler(PoolTimeout)
+async def database_busy(e):
+    print(f"Error acquiring a database connection: {e}")
+    response = jsonify({'error': 'The server is busy, please try again'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+@app.route('/login', methods=['GET', 'POST'])
+async def login():
+    if request.method == 'POST':
+        data = await request.get_json()
+        username = data.get('username')
+        password = data.get('password')
+
+        try:
+            authenticated = await db.authenticate_user(username, password)
+        except HasherBusy:
+            return busy_response()
+        if authenticated:
+            session['username'] = username
+            return jsonify({'success': True})
+        return jsonify({'success': False, 'message': 'Invalid credentials'})
+
+    return await render_template('login.html')
+
+@app.route('/register', methods=['GET', 'POST'])
+async def register():
+    if request.method == 'POST':
+        data = await request.get_json()
+        username = data.get('username')
+        password = data.get('password')
+
+        try:
+            created = await db.create_user(username, password)
+        except HasherBusy:
+            return busy_response()
+        if created:
+            return jsonify({'success': True})
+        return jsonify({'success': False, 'message': 'Username already exists'})
+
+    return await render_template('register.html')
+
+@app.route('/logout')
+async def logout():
+    session.pop('username', None)
+    quiz_key = session.pop('quiz_key', None)
+    if quiz_key:
+        await db.run_write(session_store.delete, quiz_key)
+    return redirect(url_for('login'))
+
+@app.route('/start_game', methods=['POST'])
+async def start_game():
+    if 'username' not in session:
+        return not_authenticated()
+
+    data = await request.get_json()
+    username = session['username']
+
+    saved_num_chars = await db.get_user_settings(username)
+    num_chars = parse_num_chars(data.get('num_chars'), saved_num_chars or 2200)
+    if num_chars is None:
+        return jsonify({'error': 'num_chars must be a positive whole number'}), 400
+    direction = data.get('direction', 'Japanese → English')
+    mode = 'review' if data.get('mode') == 'review' else 'learn'
+
+    # The settings write and the progress read are independent
+    _, selected_characters = await asyncio.gather(db.save_user_settings(username, num_chars),
+                                                  db.get_progress(username, direction))
+
+    old_quiz_key = session.pop('quiz_key', None)
+    if old_quiz_key:
+        await db.run_write(session_store.delete, old_quiz_key)
+    session['quiz_direction'] = direction
+    session['num_chars'] = num_chars
+    await save_quiz_state(new_quiz_state(selected_characters, mode, num_chars))
+
+    return await get_next_character()
+
+@app.route('/get_character')
+async def get_next_character():
+    if 'username' not in session:
+        return not_authenticated()
+
+    direction = session.get('quiz_direction', 'Japanese → English')
+    num_chars = session.get('num_chars', 0)
+    load_review_cards = functools.partial(database.get_review_cards, session['username'], direction)
+    count = request.args.get('count', type=int)
+    if count is not None:
+        count = min(max(count, 1), MAX_PREFETCH)
+        return jsonify(await update_quiz_state(take_cards, num_chars, count, direction, load_review_cards))
+
+    return jsonify(await update_quiz_state(issue_card, num_chars, direction, load_review_cards))
+
+@app.route('/answer', methods=['POST'])
+async def answer():
+    if 'username' not in session:
+        return not_authenticated()
+
+    data = await request.get_json(silent=True) or {}
+    if not valid_answer(data):
+        return jsonify({'error': 'answer must be {character, is_correct, answer_time_ms}'}), 400
+    character = data['character']
+
+    username = session['username']
+    direction = session.get('quiz_direction', 'Japanese → English')
+    num_chars = session.get('num_chars', 0)
+    answers = [(character, 1 if data.get('is_correct') else 0, data.get('answer_time_ms'))]
+    session_id, [(_, correct, answer_time)] = preview_answers(await load_quiz_state(), num_chars, answers)
+
+    await db.save_progress(username, character, direction, correct, answer_time, session_id)
+    await update_quiz_state(record_answers, num_chars, answers)
+
+    return jsonify({'success': True, 'character': character})
+
+@app.route('/answers', methods=['POST'])
+async def submit_answers():
+    if 'username' not in session:
+        return not_authenticated()
+
+    data = await request.get_json(silent=True) or {}
+    answers = data.get('answers')
+    if not isinstance(answers, list) or not all(valid_answer(a) for a in answers):
+        return jsonify({'error': 'answers must be a list of {character, is_correct, answer_time_ms, client_seq}'}), 400
+
+    idempotency_key = request.headers.get('Idempotency-Key') or data.get('batch_id')
+    answers = sorted(answers, key=lambda a: a.get('client_seq') or 0)
+
+    username = session['username']
+    direction = session.get('quiz_direction', 'Japanese → English')
+    num_chars = session.get('num_chars', 0)
+    answers = [(a['character'], 1 if a.get('is_correct') else 0, a.get('answer_time_ms')) for a in answers]
+    session_id, rows = preview_answers(await load_quiz_state(), num_chars, answers)
+
+    applied = await db.save_progress_batch(username, direction, session_id, rows, idempotency_key)
+    # Recording answers in the quiz state is idempotent, so a retried batch is harmless there
+    await update_quiz_state(record_answers, num_chars, answers)
+
+    return jsonify({'success': True, 'applied': applied, 'count': len(rows)})
+
+@app.route('/get_progress')
+async def get_progress_route():
+    if 'username' not in session:
+        return not_authenticated()
+
+    state = await load_quiz_state()
+    num_chars = session.get('num_chars', 0)
+    etag = make_etag('progress', session['username'], session.get('quiz_key'), state.get('revision'), num_chars,
+                     get_catalog(TXT_FILE_PATH).digest)
+    return await conditional_json(etag, lambda: progress_summary(state['selected_characters'], num_chars))
+
+@app.route('/undo_answer', methods=['POST'])
+async def undo_answer():
+    if 'username' not in session:
+        return not_authenticated()
+
+    data = await request.get_json()
+    character = data.get('character')
+
+    username = session['username']
+    direction = session.get('quiz_direction', 'Japanese → English')
+
+    if await update_quiz_state(undo_recorded_answer, session.get('num_chars', 0), character):
+        await db.delete_progress_item(username, character, direction)
+        return jsonify({'success': True})
+
+    return jsonify({'success': False, 'message': 'Character not found'})
+
+@app.route('/get_user_settings')
+async def get_user_settings_route():
+    if 'username' not in session:
+        return not_authenticated()
+
+    username = session['username']
+
+    async def settings():
+        return {'username': username, 'saved_num_chars': await db.get_user_settings(username) or 2200}
+
+    return await conditional_json(make_etag('settings', username, await db.get_settings_version(username)), settings)
+
+@app.route('/reset_progress', methods=['POST'])
+async def reset_progress_route():
+    if 'username' not in session:
+        return not_authenticated()
+
+    username = session['username']
+    direction = session.get('quiz_direction', 'Japanese → English')
+
+    await update_quiz_state(clear_answers, session.get('num_chars', 0))
+    await db.reset_progress(username, direction)
+
+    return jsonify({'success': True})
+
+@app.route('/download_csv')
+async def download_csv():
+    if 'username' not in session:
+        return not_authenticated()
+
+    username = session['username']
+    direction = request.args.get('direction')
+    session_id = request.args.get('session_id')
+    if session_id == 'current':
+        session_id = (await load_quiz_state())['session_id']
+    start_date = request.args.get('start')
+    end_date = request.args.get('end')
+    error = parse_date_range(start_date, end_date)
+    if error:
+        return jsonify({'error': error}), 400
+
+    # The cursor is read on the database threads, one chunk per step
+    chunks = csv_chunks(username, direction, session_id, start_date, end_date)
+    filename = f"{username}-japanese_characters.csv"
+    if request.args.get('gzip') == '1':
+        return attachment(db.iterate(gzip_chunks(chunks)), filename + '.gz', 'application/gzip')
+    return attachment(db.iterate(chunks), filename, 'text/csv')
+
+@app.route('/download_pdf')
+async def download_pdf():
+    if 'username' not in session:
+        return not_authenticated()
+    if pdf_exporter is None:
+        return jsonify({'error': 'PDF export requires reportlab'}), 503
+
+    username = session['username']
+    direction = request.args.get('direction') or session.get('quiz_direction', 'Japanese → English')
+    catalog = get_catalog(TXT_FILE_PATH)
+    catalog.refresh()
+    key = (username, direction, await db.get_progress_version(username), catalog.digest)
+
+    load_rows = functools.partial(pdf_rows, username, direction)
+    document, future = await db.run_read(pdf_exporter.get, key, load_rows)
+    if document is None:
+        try:
+            # Shielded so a timeout here leaves the render running for the next request
+            document = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)),
+                                              pdf_export.PDF_WAIT_SECONDS)
+        except asyncio.TimeoutError:
+            response = jsonify({'status': 'rendering'})
+            response.headers['Retry-After'] = '2'
+            return response, 202
+        except Exception as e:
+            print(f"Error rendering PDF: {e}")
+            return jsonify({'error': 'Failed to render PDF'}), 500
+
+    chunks = await db.run_read(pdf_exporter.iter_document, key, document, load_rows)
+    return attachment(db.iterate(chunks), f"{username}-japanese_characters.pdf", 'application/pdf')
+
+@app.route('/search')
+async def search():
+    if 'username' not in session:
+        return not_authenticated()
+
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'q is required'}), 400
+    try:
+        limit = min(max(int(request.args.get('limit', 20)), 1), MAX_RESULTS)
+    except ValueError:
+        return jsonify({'error': 'limit must be a number'}), 400
+
+    etag = make_etag('search', get_catalog(TXT_FILE_PATH).digest, query, limit)
+    return await conditional_json(etag, lambda: {'query': query, 'results': search_results(query, limit)})
+
+@app.route('/stats')
+async def stats():
+    if 'username' not in session:
+        return redirect(url_for('login'))
+    return await render_template('stats.html')
+
+@app.route('/api/stats')
+async def api_stats():
+    if 'username' not in session:
+        return not_authenticated()
+
+    username = session['username']
+    direction = request.args.get('direction')
+    session_id = request.args.get('session_id')
+
+    if session_id == 'current':
+        session_id = (await load_quiz_state())['session_id']
+
+    etag = make_etag('stats', username, direction, session_id, await db.get_progress_version(username),
+                     int(time.time()) // 86400)
+    return await conditional_json(etag, lambda: db.get_user_stats(username, direction, session_id))
+
+@app.route('/metrics')
+async def metrics_route():
+    if METRICS_TOKEN and request.headers.get('Authorization') != f"Bearer {METRICS_TOKEN}":
+        abort(401)
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+@app.after_serving
+async def shutdown():
+    db.close()
+
+if __name__ == '__main__':
+    port = int(os.environ.get('PORT', 5000))
+    app.run(host='0.0.0.0', port=port, debug=False)
@@ -0,0 +1,90 @@
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import database
+
+# Threads for reads; writes always go through a single writer thread
+ASYNC_DB_READERS = int(os.environ.get('ASYNC_DB_READERS', database.DB_POOL_SIZE))
+# Threads for logins and registrations, which mostly wait for the bcrypt pool
+ASYNC_AUTH_THREADS = int(os.environ.get('ASYNC_AUTH_THREADS', 8))
+
+
+def _read(func):
+    @functools.wraps(func)
+    async def call(self, *args, **kwargs):
+        return await self.run_read(func, *args, **kwargs)
+    return call
+
+
+def _auth(func):
+    @functools.wraps(func)
+    async def call(self, *args, **kwargs):
+        return await self._run(self._auth, func, *args, **kwargs)
+    return call
+
+
+def _write(func):
+    @functools.wraps(func)
+    async def call(self, *args, **kwargs):
+        return await self.run_write(func, *args, **kwargs)
+    return call
+
+
+class AsyncDatabase:
+    """database.py as coroutines for the asyncio serving mode.
+
+    Reads run on a pool of ASYNC_DB_READERS threads. Writes run one at a time on a
+    dedicated writer thread, which is the most SQLite can apply at once anyway, so
+    they queue in the executor instead of contending for the database lock. Logins
+    get threads of their own so a burst of bcrypt work cannot hold up quiz reads.
+    """
+
+    def __init__(self, readers=ASYNC_DB_READERS, auth_threads=ASYNC_AUTH_THREADS):
+        self._readers = ThreadPoolExecutor(max_workers=readers, thread_name_prefix='db-read')
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='db-write')
+        self._auth = ThreadPoolExecutor(max_workers=auth_threads, thread_name_prefix='db-auth')
+
+    async def _run(self, executor, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, functools.partial(func, *args, **kwargs))
+
+    async def run_read(self, func, *args, **kwargs):
+        return await self._run(self._readers, func, *args, **kwargs)
+
+    async def run_write(self, func, *args, **kwargs):
+        return await self._run(self._writer, func, *args, **kwargs)
+
+    async def iterate(self, iterable):
+        """Drive a blocking iterator (a cursor, a file) from the read threads"""
+        iterator = iter(iterable)
+        done = object()
+        while True:
+            item = await self.run_read(next, iterator, done)
+            if item is done:
+                return
+            yield item
+
+    authenticate_user = _auth(database.authenticate_user)
+    create_user = _auth(database.create_user)
+
+    get_user_settings = _read(database.get_user_settings)
+    get_settings_version = _read(database.get_settings_version)
+    get_progress = _read(database.get_progress)
+    get_progress_version = _read(database.get_progress_version)
+    get_user_stats = _read(database.get_user_stats)
+    get_current_session_id = _read(database.get_current_session_id)
+    get_next_review_card = _read(database.get_next_review_card)
+    get_review_cards = _read(database.get_review_cards)
+
+    save_user_settings = _write(database.save_user_settings)
+    save_progress = _write(database.save_progress)
+    save_progress_batch = _write(database.save_progress_batch)
+    delete_progress_item = _write(database.delete_progress_item)
+    reset_progress = _write(database.reset_progress)
+
+    def close(self):
+        self._readers.shutdown(wait=True)
+        self._writer.shutdown(wait=True)
+        self._auth.shutdown(wait=True)
@@ -0,0 +1,219 @@
+"""Concurrent quiz sessions served by the threaded Flask app vs the asyncio Quart app, one core each.
+
+Run from flask-kanji-app/:  python benchmarks/bench_async.py [sessions ...]
+
+Each mode runs as a single server process pinned to CPU 0 (when taskset exists):
+gunicorn with the Procfile's gthread worker, and hypercorn serving asgi_app. Every
+simulated session logs in, starts a game, then loops get_character -> think -> answer,
+reading /get_progress every tenth card. A level counts as sustained when no request
+fails and p95 latency stays under BENCH_SLO_MS (only quiz requests are measured).
+
+BENCH_DURATION (seconds per level), BENCH_THINK_MS and BENCH_SLO_MS are read from the
+environment; BCRYPT_ROUNDS defaults to 4 here so logins do not dominate the run.
+BENCH_LOGIN_CLIENTS adds clients that log in back to back throughout each level, to
+see how each mode copes while requests are stuck waiting for bcrypt.
+"""
+import http.client
+import json
+import os
+import random
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+os.environ.setdefault('BCRYPT_ROUNDS', '4')
+
+import database
+
+DURATION = float(os.environ.get('BENCH_DURATION', 10))
+THINK_MS = float(os.environ.get('BENCH_THINK_MS', 500))
+SLO_MS = float(os.environ.get('BENCH_SLO_MS', 200))
+LOGIN_CLIENTS = int(os.environ.get('BENCH_LOGIN_CLIENTS', 0))
+
+MODES = [
+    ('sync  (gunicorn gthread, 8 threads)',
+     ['gunicorn', 'app:app', '--worker-class', 'gthread', '--threads', '8', '--workers', '1', '--bind']),
+    ('async (hypercorn asyncio)',
+     ['hypercorn', 'asgi_app:app', '--workers', '1', '--bind']),
+]
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class Session:
+    """One browser: a keep-alive connection and the session cookie"""
+
+    def __init__(self, port):
+        self.conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        self.cookie = None
+
+    def request(self, method, path, body=None):
+        headers = {'Content-Type': 'application/json'}
+        if self.cookie:
+            headers['Cookie'] = self.cookie
+        body = json.dumps(body) if body is not None else None
+        try:
+            self.conn.request(method, path, body=body, headers=headers)
+            response = self.conn.getresponse()
+        except (ConnectionError, http.client.RemoteDisconnected):
+            # The server closed an idle keep-alive connection; reconnect as a browser would
+            self.conn.close()
+            self.conn.request(method, path, body=body, headers=headers)
+            response = self.conn.getresponse()
+        data = response.read()
+        cookie = response.getheader('Set-Cookie')
+        if cookie:
+            self.cookie = cookie.split(';', 1)[0]
+        if response.status != 200:
+            raise RuntimeError(f"{method} {path} -> {response.status}")
+        return json.loads(data)
+
+
+def run_level(port, sessions):
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    stop = threading.Event()
+    started = threading.Barrier(sessions + LOGIN_CLIENTS + 1)
+
+    def timed(client, method, path, body=None):
+        start = time.perf_counter()
+        result = client.request(method, path, body)
+        with lock:
+            latencies.append(time.perf_counter() - start)
+        return result
+
+    def quiz(n):
+        client = Session(port)
+        try:
+            for attempt in range(10):
+                try:
+                    client.request('POST', '/login', {'username': f"user{n}", 'password': 'password'})
+                    break
+                except RuntimeError:
+                    # Turned away by a full hashing queue; retry like the login page would
+                    client = Session(port)
+                    time.sleep(1)
+            card = client.request('POST', '/start_game', {'num_chars': 2200, 'direction': 'Japanese → English'})
+        except Exception as e:
+            errors.append(str(e))
+            started.wait()
+            return
+        started.wait()
+        answered = 0
+        # Spread the sessions out so they do not move in lockstep
+        time.sleep(random.random() * THINK_MS / 1000)
+        while not stop.is_set():
+            try:
+                if card.get('no_more_characters'):
+                    card = timed(client, 'POST', '/start_game', {'num_chars': 2200})
+                    continue
+                time.sleep(random.uniform(0.5, 1.5) * THINK_MS / 1000)
+                timed(client, 'POST', '/answer', {'character': card['character'], 'is_correct': random.random() < 0.7})
+                answered += 1
+                if answered % 10 == 0:
+                    timed(client, 'GET', '/get_progress')
+                card = timed(client, 'GET', '/get_character')
+            except Exception as e:
+                with lock:
+                    errors.append(str(e))
+                return
+        client.conn.close()
+
+    def log_in():
+        client = Session(port)
+        started.wait()
+        while not stop.is_set():
+            try:
+                client.request('POST', '/login', {'username': 'user0', 'password': 'password'})
+            except Exception:
+                # A 503 from a full hashing queue is expected here; it is not a quiz failure
+                client = Session(port)
+
+    threads = [threading.Thread(target=quiz, args=(n,), daemon=True) for n in range(sessions)]
+    threads += [threading.Thread(target=log_in, daemon=True) for _ in range(LOGIN_CLIENTS)]
+    for t in threads:
+        t.start()
+    started.wait()
+    with lock:
+        latencies.clear()
+    time.sleep(DURATION)
+    with lock:
+        measured = list(latencies)
+    stop.set()
+    for t in threads:
+        t.join(timeout=30)
+    return measured, errors
+
+
+def start_server(command, port, tmp):
+    env = dict(os.environ, KANJI_DATABASE=os.path.join(tmp, 'bench.db'),
+               SESSION_DATABASE=os.path.join(tmp, 'sessions.db'), PDF_CACHE_DIR=os.path.join(tmp, 'pdf'))
+    if shutil.which('taskset'):
+        command = ['taskset', '-c', '0'] + command
+    server = subprocess.Popen(command + [f"127.0.0.1:{port}"], cwd=APP_DIR, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    for _ in range(200):
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.1).close()
+            return server
+        except OSError:
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError(f"server did not start: {' '.join(command)}")
+
+
+def main():
+    levels = [int(arg) for arg in sys.argv[1:]] or [25, 50, 100, 200]
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DATABASE = os.path.join(tmp, 'bench.db')
+        database.init_db()
+        for n in range(max(levels)):
+            database.create_user(f"user{n}", 'password')
+        database.get_pool().close()
+
+        print(f"{DURATION:.0f} s per level, think time ~{THINK_MS:.0f} ms, SLO p95 < {SLO_MS:.0f} ms,"
+              f" {LOGIN_CLIENTS} login clients at bcrypt cost {os.environ['BCRYPT_ROUNDS']}, {os.cpu_count()} CPUs on the host")
+        for label, command in MODES:
+            if not shutil.which(command[0]):
+                print(f"{label}: {command[0]} is not installed, skipped")
+                continue
+            port = free_port()
+            server = start_server(command, port, tmp)
+            sustained = 0
+            print(f"{label}:")
+            try:
+                for sessions in levels:
+                    latencies, errors = run_level(port, sessions)
+                    p95 = percentile(latencies, 0.95) * 1000
+                    print(f"  {sessions:5d} sessions  {len(latencies) / DURATION:8.1f} req/s"
+                          f"   p50 {statistics.median(latencies) * 1000 if latencies else 0:7.1f} ms"
+                          f"   p95 {p95:7.1f} ms   p99 {percentile(latencies, 0.99) * 1000:7.1f} ms"
+                          f"   {len(errors)} errors")
+                    if errors or p95 >= SLO_MS:
+                        break
+                    sustained = sessions
+            finally:
+                server.terminate()
+                server.wait()
+            print(f"  sustained: {sustained} concurrent sessions")
+
+
+if __name__ == '__main__':
+    main()
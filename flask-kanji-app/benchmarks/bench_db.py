@@ -0,0 +1,69 @@
+"""Per-call latency of database helpers with a fresh connection per call vs the pool.
+
+Run from flask-kanji-app/:  python benchmarks/bench_db.py [iterations]
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+
+
+@contextmanager
+def unpooled_get_db():
+    # The connection handling get_db used before pooling
+    conn = sqlite3.connect(database.DATABASE)
+    conn.row_factory = sqlite3.Row
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def time_calls(label, func, iterations):
+    start = time.perf_counter()
+    for i in range(iterations):
+        func(i)
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<28} {elapsed / iterations * 1e6:9.1f} us/call")
+
+
+def run(iterations):
+    calls = {
+        'get_user_settings': lambda i: database.get_user_settings('bench'),
+        'get_progress': lambda i: database.get_progress('bench', 'Japanese → English'),
+        'save_progress': lambda i: database.save_progress('bench', chr(0x4e00 + i % 2000), 'Japanese → English',
+                                                          i % 2, 1000 + i, 'bench-session'),
+    }
+    for label, func in calls.items():
+        time_calls(label, func, iterations)
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DATABASE = os.path.join(tmp, 'bench.db')
+        database.init_db()
+        pooled_get_db = database.get_db
+        database.get_db = unpooled_get_db
+        database.create_user('bench', 'bench')
+        # Both runs read and overwrite the same set of progress rows
+        for i in range(2000):
+            database.save_progress('bench', chr(0x4e00 + i), 'Japanese → English', i % 2, 1000, 'bench-session')
+
+        print(f"connection per call ({iterations} iterations):")
+        run(iterations)
+
+        database.get_db = pooled_get_db
+        print(f"pooled connections (pool size {database.DB_POOL_SIZE}):")
+        run(iterations)
+        database.get_pool().close()
+
+
+if __name__ == '__main__':
+    main()
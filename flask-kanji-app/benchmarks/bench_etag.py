@@ -0,0 +1,68 @@
+"""Conditional GETs: times a full 200 against a 304 revalidation with If-None-Match.
+
+Covers /get_progress, /api/stats, /get_user_settings and /search, plus the size of
+/get_progress gzipped. tests/test_etag.py checks that the 304 path skips the body.
+
+Run from flask-kanji-app/:  python benchmarks/bench_etag.py [answers] [repeat]
+"""
+import gzip
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+
+def answer_cards(client, count):
+    card = client.post('/start_game', json={'num_chars': 2200, 'direction': 'Japanese → English'}).get_json()
+    for n in range(count):
+        # Mostly wrong, so /get_progress lists enough incorrect characters to be worth compressing
+        client.post('/answer', json={'character': card['character'], 'is_correct': n % 4 == 0})
+        card = client.get('/get_character').get_json()
+
+
+def median_ms(client, path, headers, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = client.get(path, headers=headers)
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times), response
+
+
+def main():
+    answers = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    os.environ.setdefault('BCRYPT_ROUNDS', '4')
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['KANJI_DATABASE'] = os.path.join(tmp, 'etag.db')
+        os.environ['SESSION_DATABASE'] = os.path.join(tmp, 'sessions.db')
+        os.chdir(APP_DIR)
+        import app as app_module
+        import database
+
+        client = app_module.app.test_client()
+        client.post('/register', json={'username': 'bench', 'password': 'bench-password'})
+        client.post('/login', json={'username': 'bench', 'password': 'bench-password'})
+        answer_cards(client, answers)
+
+        print(f"{'route':<32} {'bytes':>7} {'200 ms':>8} {'304 ms':>8}")
+        for path in ('/get_progress', '/api/stats', '/api/stats?session_id=current', '/get_user_settings',
+                     '/search?q=mouth'):
+            first = client.get(path)
+            full_ms, _ = median_ms(client, path, {}, repeat)
+            revalidated_ms, response = median_ms(client, path, {'If-None-Match': first.headers['ETag']}, repeat)
+            print(f"{path:<32} {len(first.data):>7} {full_ms:>8.3f} {revalidated_ms:>8.3f} ({response.status_code})")
+
+        plain = client.get('/get_progress')
+        packed = client.get('/get_progress', headers={'Accept-Encoding': 'gzip'})
+        assert gzip.decompress(packed.data) == plain.data
+        print(f"/get_progress gzip: {len(plain.data)} -> {len(packed.data)} bytes")
+        database.get_pool().close()
+
+
+if __name__ == '__main__':
+    main()
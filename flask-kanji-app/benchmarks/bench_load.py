@@ -0,0 +1,399 @@
+"""Load test: N simulated quiz users against the real Flask app, with per-route latency as JSON.
+
+Run from flask-kanji-app/:
+    python benchmarks/bench_load.py --users 20 --duration 20 --output load.json
+    python benchmarks/bench_load.py --server gunicorn --users 50
+    python benchmarks/bench_load.py --compare load.json      # print the change against an earlier run
+
+Every user registers, logs in and starts a game over all 2200 characters, then loops
+/get_character -> /answer, reading /get_progress every 10th and /api/stats every 25th
+answer. The default --server testclient runs the app in this process on Flask's test
+client, which also lets it count SQLite lock waits:
+  write_waits   writes or commits that took longer than --lock-wait-ms, which under
+                WAL means they queued for the database's single write lock
+  busy_errors   statements that gave up with "database is locked"
+  pool_waits    connection pool checkouts that had to wait for a free connection
+--server gunicorn starts the Procfile's gthread worker on a free port instead; lock
+waits happen in that process and are not reported.
+"""
+import argparse
+import json
+import os
+import shutil
+import socket
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+WRITE_PREFIXES = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE', 'BEGIN IMMEDIATE')
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+
+class LockCounters:
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.lock = threading.Lock()
+        self.write_waits = defaultdict(int)
+        self.write_wait_seconds = defaultdict(float)
+        self.busy_errors = defaultdict(int)
+        self.pool_waits = 0
+        self.pool_wait_seconds = 0.0
+
+    def record_write(self, path, seconds):
+        if seconds > self.threshold:
+            with self.lock:
+                self.write_waits[path] += 1
+                self.write_wait_seconds[path] += seconds
+
+    def record_busy(self, path):
+        with self.lock:
+            self.busy_errors[path] += 1
+
+    def to_dict(self):
+        paths = sorted(set(self.write_waits) | set(self.busy_errors))
+        return {
+            'threshold_ms': self.threshold * 1000,
+            'pool_waits': self.pool_waits,
+            'pool_wait_ms': round(self.pool_wait_seconds * 1000, 1),
+            'databases': {path: {'write_waits': self.write_waits[path],
+                                 'write_wait_ms': round(self.write_wait_seconds[path] * 1000, 1),
+                                 'busy_errors': self.busy_errors[path]} for path in paths}
+        }
+
+
+def instrument_sqlite(counters):
+    """Make every connection opened from now on report slow writes and busy errors"""
+    classes = {}
+
+    def timed_class(base):
+        if base not in classes:
+            classes[base] = type('TimedConnection', (TimedConnection, base), {})
+        return classes[base]
+
+    class TimedConnection(sqlite3.Connection):
+        def __init__(self, database, *args, **kwargs):
+            super().__init__(database, *args, **kwargs)
+            self.label = os.path.basename(str(database))
+
+        def _timed(self, method, sql, *args):
+            is_write = sql.lstrip().upper().startswith(WRITE_PREFIXES)
+            start = time.perf_counter()
+            try:
+                return method(sql, *args)
+            except sqlite3.OperationalError as e:
+                if 'locked' in str(e) or 'busy' in str(e):
+                    counters.record_busy(self.label)
+                raise
+            finally:
+                if is_write:
+                    counters.record_write(self.label, time.perf_counter() - start)
+
+        def execute(self, sql, *args):
+            return self._timed(super().execute, sql, *args)
+
+        def executemany(self, sql, *args):
+            return self._timed(super().executemany, sql, *args)
+
+        def commit(self):
+            start = time.perf_counter()
+            try:
+                return super().commit()
+            finally:
+                counters.record_write(self.label, time.perf_counter() - start)
+
+    connect = sqlite3.connect
+
+    def timed_connect(database, *args, **kwargs):
+        # Layered over whatever factory the caller asked for, such as the slow-query log's
+        kwargs['factory'] = timed_class(kwargs.get('factory', sqlite3.Connection))
+        return connect(database, *args, **kwargs)
+
+    sqlite3.connect = timed_connect
+
+
+def instrument_pool(counters, database):
+    acquire = database.ConnectionPool.acquire
+
+    def timed_acquire(pool):
+        start = time.perf_counter()
+        conn = acquire(pool)
+        waited = time.perf_counter() - start
+        if waited > counters.threshold:
+            with counters.lock:
+                counters.pool_waits += 1
+                counters.pool_wait_seconds += waited
+        return conn
+
+    database.ConnectionPool.acquire = timed_acquire
+
+
+class TestClientUser:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, body=None):
+        response = self.client.open(path, method=method, json=body)
+        if response.status_code != 200:
+            raise RuntimeError(f"{method} {path} -> {response.status_code}")
+        return response.get_json()
+
+
+class HttpUser:
+    """One browser against a server: a keep-alive connection and the session cookie"""
+
+    def __init__(self, port):
+        import http.client
+        self.http = http.client
+        self.conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        self.cookie = None
+
+    def request(self, method, path, body=None):
+        headers = {'Content-Type': 'application/json'}
+        if self.cookie:
+            headers['Cookie'] = self.cookie
+        body = json.dumps(body) if body is not None else None
+        try:
+            self.conn.request(method, path, body=body, headers=headers)
+            response = self.conn.getresponse()
+        except (ConnectionError, self.http.RemoteDisconnected):
+            self.conn.close()
+            self.conn.request(method, path, body=body, headers=headers)
+            response = self.conn.getresponse()
+        data = response.read()
+        cookie = response.getheader('Set-Cookie')
+        if cookie:
+            self.cookie = cookie.split(';', 1)[0]
+        if response.status != 200:
+            raise RuntimeError(f"{method} {path} -> {response.status}")
+        return json.loads(data)
+
+
+def run_users(make_user, users, duration, think):
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    lock = threading.Lock()
+    stop = threading.Event()
+    measuring = threading.Event()
+    ready = threading.Barrier(users + 1)
+
+    def timed(user, route, method, path, body=None):
+        start = time.perf_counter()
+        try:
+            return user.request(method, path, body)
+        except Exception:
+            if measuring.is_set():
+                with lock:
+                    errors[route] += 1
+            raise
+        finally:
+            if measuring.is_set():
+                with lock:
+                    latencies[route].append(time.perf_counter() - start)
+
+    def simulate(n):
+        user = make_user()
+        try:
+            credentials = {'username': f"load{n}", 'password': 'password'}
+            user.request('POST', '/register', credentials)
+            user.request('POST', '/login', credentials)
+            card = user.request('POST', '/start_game', {'num_chars': 2200, 'direction': 'Japanese → English'})
+        except Exception as e:
+            print(f"user {n} could not start: {e}")
+            ready.wait()
+            return
+        ready.wait()
+        answered = 0
+        while not stop.is_set():
+            try:
+                if card.get('no_more_characters'):
+                    card = timed(user, '/start_game', 'POST', '/start_game', {'num_chars': 2200})
+                    continue
+                if think:
+                    time.sleep(think)
+                timed(user, '/answer', 'POST', '/answer',
+                      {'character': card['character'], 'is_correct': answered % 3 != 0})
+                answered += 1
+                if answered % 10 == 0:
+                    timed(user, '/get_progress', 'GET', '/get_progress')
+                if answered % 25 == 0:
+                    timed(user, '/api/stats', 'GET', '/api/stats?session_id=current')
+                card = timed(user, '/get_character', 'GET', '/get_character')
+            except Exception:
+                # Counted above; carry on as a user would after an error
+                time.sleep(0.01)
+
+    threads = [threading.Thread(target=simulate, args=(n,), daemon=True) for n in range(users)]
+    for t in threads:
+        t.start()
+    ready.wait()
+    measuring.set()
+    started = time.perf_counter()
+    time.sleep(duration)
+    measuring.clear()
+    elapsed = time.perf_counter() - started
+    stop.set()
+    for t in threads:
+        t.join(timeout=60)
+    return latencies, errors, elapsed
+
+
+def summarize(latencies, errors, elapsed):
+    routes = {}
+    for route in sorted(set(latencies) | set(errors)):
+        values = latencies.get(route, [])
+        routes[route] = {
+            'count': len(values),
+            'errors': errors.get(route, 0),
+            'rps': round(len(values) / elapsed, 1),
+            'mean_ms': round(statistics.fmean(values) * 1000, 2) if values else 0.0,
+            'p50_ms': round(percentile(values, 0.50) * 1000, 2),
+            'p95_ms': round(percentile(values, 0.95) * 1000, 2),
+            'p99_ms': round(percentile(values, 0.99) * 1000, 2),
+            'max_ms': round(max(values) * 1000, 2) if values else 0.0,
+        }
+    every = [value for values in latencies.values() for value in values]
+    total = {
+        'count': len(every),
+        'errors': sum(errors.values()),
+        'rps': round(len(every) / elapsed, 1),
+        'p50_ms': round(percentile(every, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(every, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(every, 0.99) * 1000, 2),
+    }
+    return routes, total
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=APP_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(result):
+    print(f"{result['users']} users, {result['duration_s']:.0f} s, {result['server']}, commit {result['commit']}")
+    print(f"  {'route':<16}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for route, stats in list(result['routes'].items()) + [('all', result['total'])]:
+        print(f"  {route:<16}{stats['rps']:>9.1f}{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}"
+              f"{stats['p99_ms']:>10.2f}{stats['errors']:>8}")
+    if result['lock_waits']:
+        waits = result['lock_waits']
+        print(f"  lock waits (over {waits['threshold_ms']:.0f} ms): pool {waits['pool_waits']}"
+              f" ({waits['pool_wait_ms']} ms)")
+        for path, counts in waits['databases'].items():
+            print(f"    {path:<14} writes {counts['write_waits']} ({counts['write_wait_ms']} ms),"
+                  f" busy errors {counts['busy_errors']}")
+
+
+def print_comparison(before, after):
+    print(f"change from {before.get('commit')} to {after.get('commit')}:")
+    for route, stats in list(after['routes'].items()) + [('all', after['total'])]:
+        old = before['total'] if route == 'all' else before['routes'].get(route)
+        if not old:
+            continue
+        changes = []
+        for key in ('rps', 'p50_ms', 'p95_ms', 'p99_ms'):
+            if old[key]:
+                changes.append(f"{key} {(stats[key] - old[key]) / old[key] * 100:+6.1f}%")
+        print(f"  {route:<16}" + '   '.join(changes))
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_gunicorn(tmp, threads):
+    port = free_port()
+    env = dict(os.environ, KANJI_DATABASE=os.path.join(tmp, 'load.db'),
+               SESSION_DATABASE=os.path.join(tmp, 'sessions.db'))
+    server = subprocess.Popen(['gunicorn', 'app:app', '--worker-class', 'gthread', '--threads', str(threads),
+                               '--bind', f"127.0.0.1:{port}"], cwd=APP_DIR, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    for _ in range(200):
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.1).close()
+            return server, port
+        except OSError:
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError('gunicorn did not start')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n', 1)[0])
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--duration', type=float, default=20, help='seconds measured after every user has started')
+    parser.add_argument('--think-ms', type=float, default=0, help='pause before each answer')
+    parser.add_argument('--server', choices=('testclient', 'gunicorn'), default='testclient')
+    parser.add_argument('--threads', type=int, default=8, help='gunicorn gthread threads')
+    parser.add_argument('--lock-wait-ms', type=float, default=5)
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--compare', help='earlier JSON results to compare this run against')
+    args = parser.parse_args()
+
+    # Registration is not what is being measured
+    os.environ.setdefault('BCRYPT_ROUNDS', '4')
+    with tempfile.TemporaryDirectory() as tmp:
+        counters = None
+        if args.server == 'gunicorn':
+            if not shutil.which('gunicorn'):
+                sys.exit('gunicorn is not installed')
+            server, port = start_gunicorn(tmp, args.threads)
+            make_user = lambda: HttpUser(port)
+        else:
+            os.environ['KANJI_DATABASE'] = os.path.join(tmp, 'load.db')
+            os.environ['SESSION_DATABASE'] = os.path.join(tmp, 'sessions.db')
+            counters = LockCounters(args.lock_wait_ms / 1000)
+            instrument_sqlite(counters)
+            os.chdir(APP_DIR)
+            import database
+            instrument_pool(counters, database)
+            from app import app
+            server = None
+            make_user = lambda: TestClientUser(app)
+
+        try:
+            latencies, errors, elapsed = run_users(make_user, args.users, args.duration, args.think_ms / 1000)
+        finally:
+            if server:
+                server.terminate()
+                server.wait()
+
+    routes, total = summarize(latencies, errors, elapsed)
+    result = {
+        'commit': git_commit(),
+        'server': args.server,
+        'users': args.users,
+        'duration_s': round(elapsed, 2),
+        'think_ms': args.think_ms,
+        'cpus': os.cpu_count(),
+        'routes': routes,
+        'total': total,
+        'lock_waits': counters.to_dict() if counters else None,
+    }
+    print_report(result)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(json.load(f), result)
+
+
+if __name__ == '__main__':
+    main()
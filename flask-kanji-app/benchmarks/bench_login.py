@@ -0,0 +1,94 @@
+"""Login throughput and quiz latency while many logins run at once, hashing inline vs on the pool.
+
+Run from flask-kanji-app/:  python benchmarks/bench_login.py [login_threads] [logins_per_thread]
+
+Threads stand in for gunicorn gthread request threads: login threads call
+authenticate_user while one quiz thread keeps answering and reading progress.
+BCRYPT_ROUNDS, HASH_WORKERS and HASH_MAX_PENDING are read from the environment.
+"""
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+import password_hashing
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+
+def run(label, hasher, login_threads, logins_per_thread):
+    database.hasher = hasher
+    stop = threading.Event()
+    quiz_latencies = []
+    failures = []
+
+    def quiz():
+        i = 0
+        while not stop.is_set():
+            start = time.perf_counter()
+            database.save_progress('quiz', chr(0x4e00 + i % 2000), 'Japanese → English', i % 2, 1000, 'bench')
+            database.get_progress('quiz', 'Japanese → English')
+            quiz_latencies.append(time.perf_counter() - start)
+            i += 1
+
+    def login(n):
+        for _ in range(logins_per_thread):
+            try:
+                if not database.authenticate_user(f"user{n}", 'password'):
+                    failures.append(n)
+            except password_hashing.HasherBusy:
+                failures.append(n)
+
+    quiz_thread = threading.Thread(target=quiz)
+    quiz_thread.start()
+    time.sleep(0.2)
+    baseline = len(quiz_latencies)
+    start = time.perf_counter()
+    threads = [threading.Thread(target=login, args=(n,)) for n in range(login_threads)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    quiz_thread.join()
+
+    during = quiz_latencies[baseline:]
+    logins = login_threads * logins_per_thread
+    print(f"{label}:")
+    print(f"  logins        {logins / elapsed:8.1f}/s   {len(failures)} failed")
+    print(f"  quiz request  p50 {statistics.median(during) * 1000:7.1f} ms   p95 {percentile(during, 0.95) * 1000:7.1f} ms"
+          f"   max {max(during) * 1000:7.1f} ms   ({len(during)} during the burst)")
+    if hasher.workers:
+        print(f"  hasher        {hasher.stats()}")
+
+
+def main():
+    login_threads = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    logins_per_thread = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DATABASE = os.path.join(tmp, 'bench.db')
+        database.init_db()
+        for n in range(login_threads):
+            database.create_user(f"user{n}", 'password')
+        database.create_user('quiz', 'password')
+
+        print(f"{login_threads} threads x {logins_per_thread} logins, bcrypt cost {password_hashing.BCRYPT_ROUNDS},"
+              f" {os.cpu_count()} CPUs")
+        run('inline on request threads', password_hashing.PasswordHasher(workers=0), login_threads, logins_per_thread)
+        run(f"pool of {max(password_hashing.HASH_WORKERS, 1)}",
+            password_hashing.PasswordHasher(workers=max(password_hashing.HASH_WORKERS, 1)),
+            login_threads, logins_per_thread)
+        database.get_pool().close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+"""parse_kanji_file against the previous regex pipeline.
+
+Run from flask-kanji-app/:  python benchmarks/bench_parse_kanji.py [repeats]
+
+tests/test_parse_kanji.py checks that the output still matches kanji_data.csv.
+"""
+import csv
+import os
+import re
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import kanji_parser
+import parse_kanji
+
+INPUT_FILE = 'japanese_characters.txt'
+
+
+def legacy_parse_kanji_file(input_file, output_file, split_record=False):
+    # parse_kanji_file before the single-pass tokenizer, kept as the baseline. It split
+    # each line on every tab, which cut the quoted record after its first section, so
+    # it matched no entries; split_record=True passes the whole record to its regexes.
+    with open(input_file, 'r', encoding='utf-8') as f:
+        content = f.read()
+
+    lines = content.strip().split('\n')
+    kanji_data = []
+
+    for i, line in enumerate(lines):
+        if not line.strip():
+            continue
+
+        parts = line.split('\t', 1) if split_record else line.split('\t')
+        if len(parts) < 2:
+            continue
+
+        meaning = parts[0].strip()
+        full_description = parts[1].strip() if len(parts) > 1 else ""
+
+        char_match = re.search(r'([\u4e00-\u9faf]+)\s+.*?Lesson:\s*(\d+)', full_description)
+        if not char_match:
+            continue
+
+        character = char_match.group(1).strip()
+        lesson = char_match.group(2).strip()
+
+        desc_match = re.search(r'"([^"]*?)"', full_description)
+        description = desc_match.group(1).strip() if desc_match else ""
+
+        story_section = ""
+        story_match = re.search(r'"[^"]*"\s+(.+?)\s+On-Yomi:', full_description, re.DOTALL)
+        if story_match:
+            story_section = story_match.group(1).strip()
+
+        story_parts = re.split(r'\t\s*\t|\s{4,}', story_section)
+        story_parts = [s.strip() for s in story_parts if s.strip()]
+
+        story1 = story_parts[0] if len(story_parts) > 0 else ""
+        story2 = story_parts[1] if len(story_parts) > 1 else ""
+        if len(story_parts) > 2:
+            story2 = " ".join(story_parts[1:])
+
+        on_yomi = ""
+        kun_yomi = ""
+        examples = ""
+
+        on_match = re.search(r'On-Yomi:\s*([^\t]+?)(?:\s+Kun-Yomi:|\s+Examples:|$)', full_description)
+        if on_match:
+            on_yomi = on_match.group(1).strip()
+
+        kun_match = re.search(r'Kun-Yomi:\s*([^\t]+?)(?:\s+Examples:|$)', full_description)
+        if kun_match:
+            kun_yomi = kun_match.group(1).strip()
+
+        examples_match = re.search(r'Examples:\s*(.+?)(?:"|$)', full_description)
+        if examples_match:
+            examples = examples_match.group(1).strip()
+
+        kanji_data.append({
+            'number': i + 1,
+            'character': character,
+            'meaning': meaning,
+            'lesson': lesson,
+            'description': description,
+            'story1': story1,
+            'story2': story2,
+            'on_yomi': on_yomi,
+            'kun_yomi': kun_yomi,
+            'examples': examples
+        })
+
+    with open(output_file, 'w', newline='', encoding='utf-8') as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=parse_kanji.FIELDNAMES)
+        writer.writeheader()
+        for row in kanji_data:
+            writer.writerow(row)
+    return len(kanji_data)
+
+
+def time_parser(label, func, repeats, output):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        count = func(INPUT_FILE, output)
+        timings.append(time.perf_counter() - start)
+    print(f"  {label:<36} {min(timings) * 1000:8.1f} ms best of {repeats}  ({count} entries)")
+
+
+def quiet(func):
+    # parse_kanji_file prints its count on every call; keep the table readable
+    def call(*args):
+        stdout, sys.stdout = sys.stdout, open(os.devnull, 'w')
+        try:
+            return func(*args)
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+    return call
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    with tempfile.TemporaryDirectory() as tmp:
+        output = os.path.join(tmp, 'bench.csv')
+        time_parser('legacy (as shipped)', legacy_parse_kanji_file, repeats, output)
+        time_parser('legacy regexes on whole records',
+                    lambda i, o: legacy_parse_kanji_file(i, o, split_record=True), repeats, output)
+        time_parser('single-pass tokenizer', lambda i, o: len(kanji_parser.parse_file(i)), repeats, output)
+        time_parser('parse_kanji_file (cached deck)', quiet(parse_kanji.parse_kanji_file), repeats, output)
+        time_parser('load_deck (cached deck)', lambda i, o: len(kanji_parser.load_deck(i).records), repeats, output)
+
+
+if __name__ == '__main__':
+    main()
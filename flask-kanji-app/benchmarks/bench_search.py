@@ -0,0 +1,47 @@
+"""/search query latency on the real deck and on synthetic decks many times its size.
+
+Run from flask-kanji-app/:  python benchmarks/bench_search.py [scale ...]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from kanji_parser import parse_file
+from search_index import SearchIndex
+
+QUERIES = ['one', 'mouth', 'いち', 'イチ', 'human legs', 'tree', 'mo', 'sun day', '四', 'xyzzy']
+
+
+def scaled_deck(records, scale):
+    # Copies get distinct meanings and characters so postings grow with the deck
+    deck = list(records)
+    for copy in range(1, scale):
+        deck.extend(r._replace(number=r.number + copy * len(records), character=f"{r.character}{copy}",
+                               meaning=f"{r.meaning} v{copy}") for r in records)
+    return deck
+
+
+def run(records, scale, iterations=200):
+    deck = scaled_deck(records, scale)
+    start = time.perf_counter()
+    index = SearchIndex(deck)
+    print(f"{len(deck)} entries: built in {(time.perf_counter() - start) * 1000:.0f} ms, {len(index.terms)} terms")
+    for query in QUERIES:
+        start = time.perf_counter()
+        for _ in range(iterations):
+            results = index.search(query, 20)
+        elapsed = (time.perf_counter() - start) / iterations
+        print(f"  {query!r:<14} {elapsed * 1e6:9.1f} us  {len(results)} results")
+
+
+def main():
+    scales = [int(arg) for arg in sys.argv[1:]] or [1, 10, 50]
+    records = parse_file('japanese_characters.txt')
+    for scale in scales:
+        run(records, scale)
+
+
+if __name__ == '__main__':
+    main()
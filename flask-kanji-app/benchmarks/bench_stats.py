@@ -0,0 +1,141 @@
+"""get_user_stats latency as one user's history grows, against the previous seven-query version.
+
+"single-pass" clears the stats cache before every call; "cached" is a repeat view.
+
+Run from flask-kanji-app/:  python benchmarks/bench_stats.py [rows ...]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+
+
+def legacy_get_user_stats(username, direction=None, session_id=None):
+    # get_user_stats before the single-pass rewrite, kept as the baseline
+    with database.get_db() as conn:
+        where_clause = 'WHERE username = ?'
+        params = [username]
+        if direction:
+            where_clause += ' AND direction = ?'
+            params.append(direction)
+        if session_id:
+            where_clause += ' AND session_id = ?'
+            params.append(session_id)
+
+        total = conn.execute(f'SELECT COUNT(*) as count FROM progress {where_clause}', params).fetchone()['count']
+        correct = conn.execute(f'SELECT COUNT(*) as count FROM progress {where_clause} AND correct = 1', params).fetchone()['count']
+        timing = conn.execute(f'''SELECT
+            AVG(CASE WHEN correct = 1 THEN answer_time_ms END) as avg_correct_time,
+            AVG(CASE WHEN correct = 0 THEN answer_time_ms END) as avg_incorrect_time,
+            MIN(answer_time_ms) as fastest_time,
+            MAX(answer_time_ms) as slowest_time
+            FROM progress {where_clause} AND answer_time_ms > 0''', params).fetchone()
+
+        direction_stats = {}
+        if not direction:
+            for dir_name in database.DIRECTIONS:
+                dir_params = [username, dir_name]
+                if session_id:
+                    dir_params.append(session_id)
+                    dir_where = 'WHERE username = ? AND direction = ? AND session_id = ?'
+                else:
+                    dir_where = 'WHERE username = ? AND direction = ?'
+                dir_data = conn.execute(f'SELECT COUNT(*) as total, SUM(correct) as correct FROM progress {dir_where}', dir_params).fetchone()
+                direction_stats[database._direction_key(dir_name)] = {
+                    'total': dir_data['total'] or 0,
+                    'correct': dir_data['correct'] or 0,
+                    'percentage': round((dir_data['correct'] or 0) / dir_data['total'] * 100, 1) if dir_data['total'] > 0 else 0
+                }
+
+        recent = conn.execute(f'''SELECT DATE(answered_at) as date, COUNT(*) as total, SUM(correct) as correct,
+                                AVG(CASE WHEN correct = 1 THEN answer_time_ms END) as avg_correct_time,
+                                AVG(CASE WHEN correct = 0 THEN answer_time_ms END) as avg_incorrect_time
+                                FROM progress {where_clause} AND answered_at >= date('now', '-7 days')
+                                GROUP BY DATE(answered_at) ORDER BY date''', params).fetchall()
+
+        return {
+            'total_answered': total,
+            'total_correct': correct or 0,
+            'overall_percentage': round((correct or 0) / total * 100, 1) if total > 0 else 0,
+            'avg_correct_time': round(timing['avg_correct_time'] or 0),
+            'avg_incorrect_time': round(timing['avg_incorrect_time'] or 0),
+            'fastest_time': timing['fastest_time'] or 0,
+            'slowest_time': timing['slowest_time'] or 0,
+            **direction_stats,
+            'recent_progress': [{
+                'date': row['date'],
+                'total': row['total'],
+                'correct': row['correct'] or 0,
+                'percentage': round((row['correct'] or 0) / row['total'] * 100, 1),
+                'avg_correct_time': round(row['avg_correct_time'] or 0),
+                'avg_incorrect_time': round(row['avg_incorrect_time'] or 0)
+            } for row in recent]
+        }
+
+
+def fill_history(conn, username, start, end):
+    rng = random.Random(start)
+    conn.executemany(
+        '''INSERT INTO progress (username, character, direction, correct, answer_time_ms, session_id, answered_at)
+           VALUES (?, ?, ?, ?, ?, ?, datetime('now', ?))''',
+        ((username, f'k{i}', database.DIRECTIONS[i % 2], rng.random() < 0.7, rng.randint(0, 9000),
+          f'session-{i // 500}', f'-{rng.randint(0, 60 * 24 * 3600)} seconds') for i in range(start, end)))
+    # Another user's rows share the table and indexes
+    conn.executemany(
+        'INSERT INTO progress (username, character, direction, correct, answer_time_ms, session_id) VALUES (?, ?, ?, ?, ?, ?)',
+        (('other', f'k{i}', database.DIRECTIONS[i % 2], 1, 1000, 'other') for i in range(start, end)))
+    conn.commit()
+
+
+def time_call(func, *args, repeat=20):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+
+def uncached_get_user_stats(*args):
+    # The rows are inserted directly, so nothing bumps the version the cache is checked against
+    database._stats_cache.clear()
+    return database.get_user_stats(*args)
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000, 300000]
+    filters = [
+        ('all', (None, None)),
+        ('direction', ('Japanese → English', None)),
+        ('session', (None, 'session-1')),
+    ]
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DATABASE = os.path.join(tmp, 'bench.db')
+        database.init_db()
+        filled = 0
+        print(f"{'rows':>8} {'filter':<10} {'legacy ms':>10} {'single-pass ms':>15} {'cached ms':>10}")
+        for size in sizes:
+            with database.get_db() as conn:
+                fill_history(conn, 'bench', filled, size)
+                # Mirror the synthetic rows into the answer history the stats now read from
+                conn.execute('DELETE FROM answer_log')
+                database.seed_answer_history(conn)
+                conn.execute('ANALYZE')
+                conn.commit()
+            filled = size
+            for label, (direction, session_id) in filters:
+                legacy_ms, legacy = time_call(legacy_get_user_stats, 'bench', direction, session_id)
+                new_ms, new = time_call(uncached_get_user_stats, 'bench', direction, session_id)
+                cached_ms, cached = time_call(database.get_user_stats, 'bench', direction, session_id)
+                assert new == legacy == cached, (label, new, legacy)
+                print(f"{size:>8} {label:<10} {legacy_ms:>10.2f} {new_ms:>15.2f} {cached_ms:>10.3f}")
+        database.get_pool().close()
+
+
+if __name__ == '__main__':
+    main()
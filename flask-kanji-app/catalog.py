@@ -0,0 +1,106 @@
+import bisect
+import os
+import threading
+import time
+from array import array
+
+from kanji_parser import load_deck
+
+# Seconds between mtime checks of the source file
+CHECK_INTERVAL = float(os.environ.get('CATALOG_CHECK_INTERVAL', 2.0))
+
+
+class KanjiCatalog:
+    """Kanji entries parsed once per process and reloaded when the source file changes"""
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.numbers = array('I')
+        self.characters = ()
+        self.meanings = ()
+        self.records = ()
+        self.index_by_character = {}
+        self.digest = None
+        self._stat = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.refresh(force=True)
+
+    def refresh(self, force=False):
+        """Reload the source file if its mtime/size changed and its content hash differs"""
+        now = time.monotonic()
+        if not force and now - self._checked_at < CHECK_INTERVAL:
+            return False
+        with self._lock:
+            self._checked_at = now
+            try:
+                st = os.stat(self.file_path)
+                stat_key = (st.st_mtime_ns, st.st_size)
+                if not force and stat_key == self._stat:
+                    return False
+                # Parsed decks are cached on disk by content hash, so this is cheap after the first run
+                deck = load_deck(self.file_path)
+            except OSError as e:
+                print(f"Error reading file: {e}")
+                return False
+
+            self._stat = stat_key
+            if deck.digest == self.digest:
+                return False
+
+            records = deck.records
+            characters = tuple(r.character for r in records)
+            # Swap in the new structures together so readers never see a mix
+            self.numbers = array('I', (r.number for r in records))
+            self.characters = characters
+            self.meanings = tuple(r.meaning for r in records)
+            self.records = records
+            self.index_by_character = {char: i for i, char in enumerate(characters)}
+            self.digest = deck.digest
+            return True
+
+    def __len__(self):
+        return len(self.characters)
+
+    def entry(self, index):
+        return (self.numbers[index], self.characters[index], self.meanings[index])
+
+    def count_upto(self, num_rows):
+        """Number of entries that come from the first num_rows lines of the file"""
+        return bisect.bisect_right(self.numbers, num_rows)
+
+    def first(self, num_rows):
+        """Entries from the first num_rows lines as (number, character, meaning) tuples"""
+        self.refresh()
+        end = self.count_upto(num_rows)
+        return list(zip(self.numbers[:end], self.characters[:end], self.meanings[:end]))
+
+    def by_number(self, number):
+        self.refresh()
+        index = bisect.bisect_left(self.numbers, number)
+        if index < len(self.numbers) and self.numbers[index] == number:
+            return self.entry(index)
+        return None
+
+    def index_of(self, character):
+        return self.index_by_character.get(character)
+
+    def by_character(self, character):
+        self.refresh()
+        index = self.index_by_character.get(character)
+        return self.entry(index) if index is not None else None
+
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_catalog(file_path):
+    """Process-wide catalog for file_path, created on first use"""
+    catalog = _catalogs.get(file_path)
+    if catalog is None:
+        with _catalogs_lock:
+            catalog = _catalogs.get(file_path)
+            if catalog is None:
+                catalog = _catalogs[file_path] = KanjiCatalog(file_path)
+    return catalog
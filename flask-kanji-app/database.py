@@ -1,9 +1,40 @@
+import os
+import queue
 import sqlite3
-import bcrypt
+import threading
+import time
 import json
 from contextlib import contextmanager
+from write_behind import WriteBehindQueue
+from stats_cache import StatsCache
+from password_hashing import hasher
+import metrics
+import query_log
+from metrics import timed_db_call
+import srs
 
-DATABASE = 'kanji.db'
+DATABASE = os.environ.get('KANJI_DATABASE', 'kanji.db')
+
+DIRECTIONS = ['Japanese → English', 'English → Japanese']
+
+# Connection pool settings
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 4))
+DB_BUSY_TIMEOUT_MS = int(os.environ.get('DB_BUSY_TIMEOUT_MS', 5000))
+DB_CACHE_SIZE_KB = int(os.environ.get('DB_CACHE_SIZE_KB', 8192))
+DB_MMAP_SIZE = int(os.environ.get('DB_MMAP_SIZE', 64 * 1024 * 1024))
+DB_STATEMENT_CACHE_SIZE = int(os.environ.get('DB_STATEMENT_CACHE_SIZE', 256))
+# Seconds a thread waits for a free pooled connection before the call fails
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', DB_BUSY_TIMEOUT_MS / 1000))
+
+# Optional write-behind batching of save_progress; off means every answer is committed before returning.
+# The queue is per worker process: reads, deletes and resets flush the user's answers queued in their
+# own worker, but answers still queued in another worker may land after them.
+WRITE_BEHIND = os.environ.get('WRITE_BEHIND', 'off') == 'on'
+WRITE_BEHIND_BATCH_SIZE = int(os.environ.get('WRITE_BEHIND_BATCH_SIZE', 100))
+WRITE_BEHIND_INTERVAL_MS = int(os.environ.get('WRITE_BEHIND_INTERVAL_MS', 200))
+
+# How long an /answers idempotency key is remembered
+ANSWER_BATCH_KEY_TTL = int(os.environ.get('ANSWER_BATCH_KEY_TTL', 24 * 3600))
 
 def init_db():
     with sqlite3.connect(DATABASE) as conn:
@@ -45,28 +76,233 @@ def init_db():
             conn.execute('ALTER TABLE progress ADD COLUMN session_id TEXT')
         except sqlite3.OperationalError:
             pass  # Column already exists
+        
+        # Bumped whenever num_chars changes, for the ETag of /get_user_settings
+        try:
+            conn.execute('ALTER TABLE user_settings ADD COLUMN version INTEGER NOT NULL DEFAULT 0')
+        except sqlite3.OperationalError:
+            pass  # Column already exists
+        
+        # Covering indexes for get_user_stats, with and without a session filter
+        conn.execute('''CREATE INDEX IF NOT EXISTS idx_progress_user_direction_time
+                        ON progress (username, direction, answered_at, correct, answer_time_ms)''')
+        conn.execute('''CREATE INDEX IF NOT EXISTS idx_progress_user_session
+                        ON progress (username, session_id, direction, answered_at, correct, answer_time_ms)''')
+        # Latest answer first for get_current_session_id, without sorting the user's whole history
+        conn.execute('''CREATE INDEX IF NOT EXISTS idx_progress_user_time
+                        ON progress (username, answered_at, session_id)''')
+        
+        # Append-only history of every answer; progress only keeps the latest one per card.
+        # Directions are stored as ids and answered_at as unix seconds to keep rows small.
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS directions (
+                id INTEGER PRIMARY KEY,
+                name TEXT UNIQUE NOT NULL
+            )
+        ''')
+        conn.executemany('INSERT OR IGNORE INTO directions (id, name) VALUES (?, ?)',
+                         [(i + 1, name) for i, name in enumerate(DIRECTIONS)])
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS answer_log (
+                id INTEGER PRIMARY KEY,
+                username TEXT NOT NULL,
+                character TEXT NOT NULL,
+                direction_id INTEGER NOT NULL,
+                correct INTEGER NOT NULL,
+                answer_time_ms INTEGER NOT NULL DEFAULT 0,
+                session_id TEXT,
+                answered_at INTEGER NOT NULL
+            )
+        ''')
+        conn.execute('''CREATE INDEX IF NOT EXISTS idx_answer_log_card
+                        ON answer_log (username, character, direction_id)''')
+        conn.execute('''CREATE INDEX IF NOT EXISTS idx_answer_log_session
+                        ON answer_log (username, session_id, answered_at)''')
+        
+        # Per user/day/direction totals kept up to date on every write, for time-series stats
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS daily_rollups (
+                username TEXT NOT NULL,
+                day INTEGER NOT NULL,
+                direction_id INTEGER NOT NULL,
+                total INTEGER NOT NULL DEFAULT 0,
+                correct INTEGER NOT NULL DEFAULT 0,
+                correct_ms INTEGER NOT NULL DEFAULT 0,
+                incorrect_ms INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (username, day, direction_id)
+            ) WITHOUT ROWID
+        ''')
+        
+        # Spaced-repetition state per card; prev_* holds the schedule before the last answer for undo
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS review_cards (
+                username TEXT NOT NULL,
+                direction_id INTEGER NOT NULL,
+                character TEXT NOT NULL,
+                reps INTEGER NOT NULL DEFAULT 0,
+                interval_days REAL NOT NULL DEFAULT 0,
+                ease REAL NOT NULL,
+                due_at INTEGER NOT NULL,
+                prev_reps INTEGER,
+                prev_interval_days REAL,
+                prev_ease REAL,
+                prev_due_at INTEGER,
+                PRIMARY KEY (username, direction_id, character)
+            ) WITHOUT ROWID
+        ''')
+        conn.execute('''CREATE INDEX IF NOT EXISTS idx_review_cards_due
+                        ON review_cards (username, direction_id, due_at)''')
+        
+        # Idempotency keys of applied /answers batches, so client retries are not double counted
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS answer_batches (
+                username TEXT NOT NULL,
+                batch_key TEXT NOT NULL,
+                created_at INTEGER NOT NULL,
+                PRIMARY KEY (username, batch_key)
+            ) WITHOUT ROWID
+        ''')
+        
+        # Bumped by every progress write so caches can key on (username, version)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS progress_versions (
+                username TEXT PRIMARY KEY,
+                version INTEGER NOT NULL DEFAULT 0
+            ) WITHOUT ROWID
+        ''')
+        
+        # Seed the history from existing progress the first time the log is created
+        if conn.execute('SELECT 1 FROM answer_log LIMIT 1').fetchone() is None:
+            seed_answer_history(conn)
             
         conn.commit()
 
+def seed_answer_history(conn):
+    """Copy progress rows into answer_log and rebuild daily_rollups from the log"""
+    conn.execute('INSERT OR IGNORE INTO directions (name) SELECT DISTINCT direction FROM progress WHERE direction IS NOT NULL')
+    conn.execute('''INSERT INTO answer_log (username, character, direction_id, correct, answer_time_ms, session_id, answered_at)
+                    SELECT p.username, p.character, d.id, p.correct, COALESCE(p.answer_time_ms, 0), p.session_id,
+                           CAST(strftime('%s', p.answered_at) AS INTEGER)
+                    FROM progress p JOIN directions d ON d.name = p.direction
+                    ORDER BY p.answered_at''')
+    conn.execute('DELETE FROM daily_rollups')
+    conn.execute('''INSERT INTO daily_rollups (username, day, direction_id, total, correct, correct_ms, incorrect_ms)
+                    SELECT username, answered_at / 86400, direction_id, COUNT(*), SUM(correct),
+                           SUM(CASE WHEN correct = 1 THEN answer_time_ms ELSE 0 END),
+                           SUM(CASE WHEN correct = 1 THEN 0 ELSE answer_time_ms END)
+                    FROM answer_log GROUP BY username, answered_at / 86400, direction_id''')
+
+class PoolTimeout(sqlite3.OperationalError):
+    """Raised when no pooled connection frees up within DB_POOL_TIMEOUT seconds"""
+
+
+class ConnectionPool:
+    """Bounded pool of long-lived, pragma-tuned connections shared by the worker's threads"""
+
+    def __init__(self, path, size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self.pid = os.getpid()
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        # cached_statements is sqlite3's per-connection prepared statement LRU
+        factory = query_log.ProfiledConnection if query_log.enabled() else sqlite3.Connection
+        conn = sqlite3.connect(self.path, timeout=DB_BUSY_TIMEOUT_MS / 1000, check_same_thread=False,
+                               cached_statements=DB_STATEMENT_CACHE_SIZE, factory=factory)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(f'PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}')
+        conn.execute(f'PRAGMA cache_size=-{DB_CACHE_SIZE_KB}')
+        conn.execute(f'PRAGMA mmap_size={DB_MMAP_SIZE}')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        return conn
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                try:
+                    return self._connect()
+                except Exception:
+                    self._created -= 1
+                    raise
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise PoolTimeout(f"No free database connection after {self.timeout:g} s "
+                              f"(all {self.size} in use)") from None
+
+    def connect_unpooled(self):
+        """A read-only connection with the pool's settings, outside its limit; the caller closes it"""
+        conn = self._connect()
+        conn.execute('PRAGMA query_only=ON')
+        return conn
+
+    def release(self, conn):
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            # Drop a broken connection so the pool can open a fresh one
+            with self._lock:
+                self._created -= 1
+            conn.close()
+            return
+        self._idle.put(conn)
+
+    def close(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    global _pool
+    # Connections must not cross a fork, so each gunicorn worker builds its own pool
+    if _pool is None or _pool.pid != os.getpid() or _pool.path != DATABASE:
+        with _pool_lock:
+            if _pool is None or _pool.pid != os.getpid() or _pool.path != DATABASE:
+                _pool = ConnectionPool(DATABASE)
+    return _pool
+
 @contextmanager
 def get_db():
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row
+    pool = get_pool()
+    conn = pool.acquire()
     try:
         yield conn
     finally:
-        conn.close()
+        pool.release(conn)
 
+# bcrypt runs on the hasher's pool and never while a pooled connection is held
 def hash_password(password):
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    return hasher.hash(password)
 
 def verify_password(password, password_hash):
-    return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+    return hasher.check(password, password_hash)
 
+@timed_db_call
 def create_user(username, password):
+    password_hash = hash_password(password)
     with get_db() as conn:
         try:
-            password_hash = hash_password(password)
             conn.execute('INSERT INTO users (username, password_hash) VALUES (?, ?)', 
                         (username, password_hash))
             conn.execute('INSERT INTO user_settings (username) VALUES (?)', (username,))
@@ -75,120 +311,419 @@ def create_user(username, password):
         except sqlite3.IntegrityError:
             return False
 
+@timed_db_call
 def authenticate_user(username, password):
     with get_db() as conn:
         user = conn.execute('SELECT password_hash FROM users WHERE username = ?', 
                            (username,)).fetchone()
-        if user and verify_password(password, user['password_hash']):
-            return True
-    return False
+    if not user or not verify_password(password, user['password_hash']):
+        return False
+    if hasher.needs_rehash(user['password_hash']):
+        # Upgrade to the current BCRYPT_ROUNDS unless the password changed meanwhile
+        new_hash = hash_password(password)
+        with get_db() as conn:
+            conn.execute('UPDATE users SET password_hash = ? WHERE username = ? AND password_hash = ?',
+                         (new_hash, username, user['password_hash']))
+            conn.commit()
+    return True
 
+@timed_db_call
 def get_user_settings(username):
     with get_db() as conn:
         settings = conn.execute('SELECT num_chars FROM user_settings WHERE username = ?', 
                                (username,)).fetchone()
         return settings['num_chars'] if settings else 2200
 
+@timed_db_call
 def save_user_settings(username, num_chars):
     with get_db() as conn:
-        conn.execute('INSERT OR REPLACE INTO user_settings (username, num_chars) VALUES (?, ?)', 
-                    (username, num_chars))
+        conn.execute('''INSERT INTO user_settings (username, num_chars, version) VALUES (?, ?, 1)
+                        ON CONFLICT (username) DO UPDATE SET num_chars = excluded.num_chars, version = version + 1
+                        WHERE num_chars IS NOT excluded.num_chars''', (username, num_chars))
         conn.commit()
 
+@timed_db_call
+def get_settings_version(username):
+    """Counter that changes whenever the user's saved settings do; 0 before any are saved"""
+    with get_db() as conn:
+        row = conn.execute('SELECT version FROM user_settings WHERE username = ?', (username,)).fetchone()
+        return row['version'] if row else 0
+
+@timed_db_call
 def get_progress(username, direction):
+    flush_pending_writes(username)
     with get_db() as conn:
         rows = conn.execute('SELECT character, correct FROM progress WHERE username = ? AND direction = ?', 
                            (username, direction)).fetchall()
         return {row['character']: row['correct'] for row in rows}
 
+_direction_ids = {}
+
+def _lookup_direction_id(conn, direction):
+    row = conn.execute('SELECT id FROM directions WHERE name = ?', (direction,)).fetchone()
+    if row is None:
+        return None
+    _direction_ids[direction] = row['id']
+    return row['id']
+
+def get_direction_id(direction):
+    direction_id = _direction_ids.get(direction)
+    if direction_id is None:
+        with get_db() as conn:
+            conn.execute('INSERT OR IGNORE INTO directions (name) VALUES (?)', (direction,))
+            conn.commit()
+            direction_id = _lookup_direction_id(conn, direction)
+    return direction_id
+
+def _resolve_direction_ids(rows):
+    # Resolved before a connection is borrowed, since get_direction_id may need one of its own
+    return {direction: get_direction_id(direction) for _, _, direction, *_ in rows}
+
+@timed_db_call
+def _write_progress_rows(rows):
+    direction_ids = _resolve_direction_ids(rows)
+    with get_db() as conn:
+        _apply_progress_rows(conn, rows, direction_ids)
+        conn.commit()
+
+def _apply_progress_rows(conn, rows, direction_ids):
+    """Write answers to progress, the answer log, daily rollups and review cards without committing"""
+    conn.executemany('''INSERT OR REPLACE INTO progress (username, character, direction, correct, answer_time_ms, session_id, answered_at)
+                        VALUES (?, ?, ?, ?, ?, ?, datetime(?, 'unixepoch'))''', rows)
+    log_rows = [(username, character, direction_ids[direction], correct, answer_time_ms or 0, session_id, answered_at)
+                for username, character, direction, correct, answer_time_ms, session_id, answered_at in rows]
+    conn.executemany('''INSERT INTO answer_log (username, character, direction_id, correct, answer_time_ms, session_id, answered_at)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)''', log_rows)
+    conn.executemany('''INSERT INTO daily_rollups (username, day, direction_id, total, correct, correct_ms, incorrect_ms)
+                        VALUES (?, ?, ?, 1, ?, ?, ?)
+                        ON CONFLICT (username, day, direction_id) DO UPDATE SET
+                            total = total + 1,
+                            correct = correct + excluded.correct,
+                            correct_ms = correct_ms + excluded.correct_ms,
+                            incorrect_ms = incorrect_ms + excluded.incorrect_ms''',
+                     [(username, answered_at // 86400, direction_id, 1 if correct == 1 else 0,
+                       answer_time_ms if correct == 1 else 0, 0 if correct == 1 else answer_time_ms)
+                      for username, _, direction_id, correct, answer_time_ms, _, answered_at in log_rows])
+    for username, character, direction_id, correct, _, _, answered_at in log_rows:
+        _schedule_review(conn, username, character, direction_id, correct == 1, answered_at)
+    for username in {row[0] for row in rows}:
+        _bump_progress_version(conn, username)
+
+def _bump_progress_version(conn, username):
+    conn.execute('''INSERT INTO progress_versions (username, version) VALUES (?, 1)
+                    ON CONFLICT (username) DO UPDATE SET version = version + 1''', (username,))
+
+@timed_db_call
+def get_progress_version(username):
+    """Counter that changes whenever the user's progress does"""
+    flush_pending_writes(username)
+    with get_db() as conn:
+        return _read_progress_version(conn, username)
+
+def _read_progress_version(conn, username):
+    row = conn.execute('SELECT version FROM progress_versions WHERE username = ?', (username,)).fetchone()
+    return row['version'] if row else 0
+
+def _schedule_review(conn, username, character, direction_id, correct, now):
+    card = conn.execute('SELECT reps, interval_days, ease, due_at FROM review_cards WHERE username = ? AND direction_id = ? AND character = ?',
+                        (username, direction_id, character)).fetchone()
+    if card is None:
+        reps, interval_days, ease, due_at = srs.schedule(0, 0.0, srs.DEFAULT_EASE, correct, now)
+        conn.execute('''INSERT INTO review_cards (username, direction_id, character, reps, interval_days, ease, due_at)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)''', (username, direction_id, character, reps, interval_days, ease, due_at))
+        return
+    reps, interval_days, ease, due_at = srs.schedule(card['reps'], card['interval_days'], card['ease'], correct, now)
+    conn.execute('''UPDATE review_cards SET reps = ?, interval_days = ?, ease = ?, due_at = ?,
+                        prev_reps = ?, prev_interval_days = ?, prev_ease = ?, prev_due_at = ?
+                    WHERE username = ? AND direction_id = ? AND character = ?''',
+                 (reps, interval_days, ease, due_at, card['reps'], card['interval_days'], card['ease'], card['due_at'],
+                  username, direction_id, character))
+
+def _unschedule_review(conn, username, character, direction_id):
+    # Restore the schedule from before the undone answer; a card seen once is dropped
+    conn.execute('DELETE FROM review_cards WHERE username = ? AND direction_id = ? AND character = ? AND prev_due_at IS NULL',
+                 (username, direction_id, character))
+    conn.execute('''UPDATE review_cards SET reps = prev_reps, interval_days = prev_interval_days, ease = prev_ease,
+                        due_at = prev_due_at, prev_reps = NULL, prev_interval_days = NULL, prev_ease = NULL, prev_due_at = NULL
+                    WHERE username = ? AND direction_id = ? AND character = ?''', (username, direction_id, character))
+
+@timed_db_call
+def get_review_cards(username, direction, limit=1):
+    """Review cards in due order as (character, due_at) tuples, including ones not yet due"""
+    flush_pending_writes(username)
+    direction_id = get_direction_id(direction)
+    with get_db() as conn:
+        cards = conn.execute('''SELECT character, due_at FROM review_cards WHERE username = ? AND direction_id = ?
+                                ORDER BY due_at LIMIT ?''', (username, direction_id, limit)).fetchall()
+        return [(card['character'], card['due_at']) for card in cards]
+
+@timed_db_call
+def get_next_review_card(username, direction):
+    """Earliest-due review card as (character, due_at), or None if the user has no cards"""
+    cards = get_review_cards(username, direction, 1)
+    return cards[0] if cards else None
+
+# Keyed by username: one user's queued answers are independent of everyone else's. A locked
+# database or a full pool is retried later; a row that breaks a constraint is dropped.
+_progress_queue = WriteBehindQueue(_write_progress_rows, WRITE_BEHIND_BATCH_SIZE,
+                                   WRITE_BEHIND_INTERVAL_MS / 1000, synchronous=not WRITE_BEHIND,
+                                   key=lambda row: row[0], transient=(sqlite3.OperationalError,))
+
+metrics.register(metrics.Gauge('kanji_write_behind_pending', 'Answers queued for the background writer',
+                               lambda: len(_progress_queue)))
+metrics.register(metrics.Gauge('kanji_write_behind_dropped_total', 'Queued answers dropped because they could not be written',
+                               lambda: _progress_queue.dropped, type='counter'))
+metrics.register(metrics.Gauge('kanji_db_pool_connections', 'Pooled database connections in this worker, by state',
+                               lambda: {('open',): get_pool()._created, ('idle',): get_pool()._idle.qsize()},
+                               ('state',)))
+
+def configure_write_behind(enabled, batch_size=WRITE_BEHIND_BATCH_SIZE, interval_ms=WRITE_BEHIND_INTERVAL_MS):
+    """Switch batching on or off at runtime; tests use enabled=False for strict synchronous writes"""
+    _progress_queue.flush()
+    _progress_queue.synchronous = not enabled
+    _progress_queue.batch_size = batch_size
+    _progress_queue.interval = interval_ms / 1000
+
+@timed_db_call
+def flush_pending_writes(username=None):
+    """Apply queued answers before a read or delete; only the user's own when username is given"""
+    return _progress_queue.flush(username)
+
+@timed_db_call
 def save_progress(username, character, direction, correct, answer_time_ms=0, session_id=None):
+    # Checked here rather than when the queue is flushed, where the caller could no longer be told
+    if not character or not direction or correct not in (0, 1):
+        raise ValueError(f"Invalid answer: {character!r}, {direction!r}, {correct!r}")
+    _progress_queue.put((username, character, direction, correct, answer_time_ms, session_id, int(time.time())))
+
+@timed_db_call
+def save_progress_batch(username, direction, session_id, answers, idempotency_key=None):
+    """Apply (character, correct, answer_time_ms) answers in one transaction.
+
+    Returns False without writing anything if idempotency_key was already applied for this user.
+    """
+    now = int(time.time())
+    rows = [(username, character, direction, correct, answer_time_ms, session_id, now)
+            for character, correct, answer_time_ms in answers]
+    direction_ids = _resolve_direction_ids(rows)
+    # The user's earlier single answers still in the write-behind queue must land first
+    flush_pending_writes(username)
     with get_db() as conn:
-        conn.execute('INSERT OR REPLACE INTO progress (username, character, direction, correct, answer_time_ms, session_id) VALUES (?, ?, ?, ?, ?, ?)', 
-                    (username, character, direction, correct, answer_time_ms, session_id))
+        if idempotency_key:
+            try:
+                conn.execute('INSERT INTO answer_batches (username, batch_key, created_at) VALUES (?, ?, ?)',
+                             (username, idempotency_key, now))
+            except sqlite3.IntegrityError:
+                conn.rollback()
+                return False
+            conn.execute('DELETE FROM answer_batches WHERE username = ? AND created_at < ?',
+                         (username, now - ANSWER_BATCH_KEY_TTL))
+        _apply_progress_rows(conn, rows, direction_ids)
         conn.commit()
+    return True
 
+@timed_db_call
 def delete_progress_item(username, character, direction):
+    # Queued answers must land before the delete, or a pending write could resurrect the row
+    flush_pending_writes(username)
+    direction_id = get_direction_id(direction)
     with get_db() as conn:
         conn.execute('DELETE FROM progress WHERE username = ? AND character = ? AND direction = ?', 
                     (username, character, direction))
+        # An undo retracts the attempt from the history and its day's rollup as well
+        attempt = conn.execute('''SELECT id, correct, answer_time_ms, answered_at FROM answer_log
+                                  WHERE username = ? AND character = ? AND direction_id = ?
+                                  ORDER BY id DESC LIMIT 1''', (username, character, direction_id)).fetchone()
+        _unschedule_review(conn, username, character, direction_id)
+        _bump_progress_version(conn, username)
+        if attempt:
+            is_correct = attempt['correct'] == 1
+            conn.execute('DELETE FROM answer_log WHERE id = ?', (attempt['id'],))
+            conn.execute('''UPDATE daily_rollups SET total = total - 1, correct = correct - ?,
+                                correct_ms = correct_ms - ?, incorrect_ms = incorrect_ms - ?
+                            WHERE username = ? AND day = ? AND direction_id = ?''',
+                         (1 if is_correct else 0, attempt['answer_time_ms'] if is_correct else 0,
+                          0 if is_correct else attempt['answer_time_ms'], username, attempt['answered_at'] // 86400, direction_id))
         conn.commit()
 
+@timed_db_call
 def reset_progress(username, direction):
+    flush_pending_writes(username)
+    direction_id = get_direction_id(direction)
     with get_db() as conn:
         conn.execute('DELETE FROM progress WHERE username = ? AND direction = ?', 
                     (username, direction))
+        conn.execute('DELETE FROM review_cards WHERE username = ? AND direction_id = ?', (username, direction_id))
+        # Like an undo, a reset takes the answers out of the history and the daily rollups too
+        conn.execute('DELETE FROM answer_log WHERE username = ? AND direction_id = ?', (username, direction_id))
+        conn.execute('DELETE FROM daily_rollups WHERE username = ? AND direction_id = ?', (username, direction_id))
+        _bump_progress_version(conn, username)
         conn.commit()
 
+def _direction_key(direction):
+    return direction.replace(' → ', '_to_').replace('Japanese', 'jp').replace('English', 'en')
+
+def _percentage(correct, total):
+    return round(correct / total * 100, 1) if total > 0 else 0
+
+def _average(total_ms, count):
+    return round(total_ms / count) if count else 0
+
+def _day_to_date(day):
+    return time.strftime('%Y-%m-%d', time.gmtime(day * 86400))
+
+_stats_cache = StatsCache()
+
+@timed_db_call
 def get_user_stats(username, direction=None, session_id=None):
+    """Stats for the user's answers, cached until their progress version or the day changes"""
+    flush_pending_writes(username)
     with get_db() as conn:
-        where_clause = 'WHERE username = ?'
-        params = [username]
-        
-        if direction:
-            where_clause += ' AND direction = ?'
-            params.append(direction)
-        
-        if session_id:
-            where_clause += ' AND session_id = ?'
-            params.append(session_id)
-        
-        # Overall stats
-        total = conn.execute(f'SELECT COUNT(*) as count FROM progress {where_clause}', params).fetchone()['count']
-        correct = conn.execute(f'SELECT COUNT(*) as count FROM progress {where_clause} AND correct = 1', params).fetchone()['count']
-        
-        # Timing stats
-        timing = conn.execute(f'''SELECT 
-            AVG(CASE WHEN correct = 1 THEN answer_time_ms END) as avg_correct_time,
-            AVG(CASE WHEN correct = 0 THEN answer_time_ms END) as avg_incorrect_time,
-            MIN(answer_time_ms) as fastest_time,
-            MAX(answer_time_ms) as slowest_time
-            FROM progress {where_clause} AND answer_time_ms > 0''', params).fetchone()
-        
-        # Direction breakdown (only if no direction filter)
-        direction_stats = {}
-        if not direction:
-            for dir_name in ['Japanese → English', 'English → Japanese']:
-                dir_params = [username, dir_name]
-                if session_id:
-                    dir_params.append(session_id)
-                    dir_where = 'WHERE username = ? AND direction = ? AND session_id = ?'
-                else:
-                    dir_where = 'WHERE username = ? AND direction = ?'
-                
-                dir_data = conn.execute(f'SELECT COUNT(*) as total, SUM(correct) as correct FROM progress {dir_where}', dir_params).fetchone()
-                direction_stats[dir_name.replace(' → ', '_to_').replace('Japanese', 'jp').replace('English', 'en')] = {
-                    'total': dir_data['total'] or 0,
-                    'correct': dir_data['correct'] or 0,
-                    'percentage': round((dir_data['correct'] or 0) / dir_data['total'] * 100, 1) if dir_data['total'] > 0 else 0
-                }
-        
-        # Recent progress (last 7 days)
-        recent = conn.execute(f'''SELECT DATE(answered_at) as date, COUNT(*) as total, SUM(correct) as correct,
-                                AVG(CASE WHEN correct = 1 THEN answer_time_ms END) as avg_correct_time,
-                                AVG(CASE WHEN correct = 0 THEN answer_time_ms END) as avg_incorrect_time
-                                FROM progress {where_clause} AND answered_at >= date('now', '-7 days') 
-                                GROUP BY DATE(answered_at) ORDER BY date''', params).fetchall()
-        
-        return {
-            'total_answered': total,
-            'total_correct': correct or 0,
-            'overall_percentage': round((correct or 0) / total * 100, 1) if total > 0 else 0,
-            'avg_correct_time': round(timing['avg_correct_time'] or 0),
-            'avg_incorrect_time': round(timing['avg_incorrect_time'] or 0),
-            'fastest_time': timing['fastest_time'] or 0,
-            'slowest_time': timing['slowest_time'] or 0,
-            **direction_stats,
-            'recent_progress': [{
-                'date': row['date'],
-                'total': row['total'],
-                'correct': row['correct'] or 0,
-                'percentage': round((row['correct'] or 0) / row['total'] * 100, 1),
-                'avg_correct_time': round(row['avg_correct_time'] or 0),
-                'avg_incorrect_time': round(row['avg_incorrect_time'] or 0)
-            } for row in recent]
-        }
+        # Read before computing: a write that lands in between bumps the version, so the
+        # entry is only ever served for a version at least as old as its data
+        version = _read_progress_version(conn, username)
+        today = int(time.time()) // 86400
+        key = (username, direction, session_id)
+        stats = _stats_cache.get(key, (version, today))
+        if stats is None:
+            stats = _compute_user_stats(conn, username, direction, session_id, today)
+            _stats_cache.set(key, (version, today), stats)
+        return stats
+
+def _compute_user_stats(conn, username, direction, session_id, today):
+    where_clause = 'WHERE username = ?'
+    params = [username]
+    
+    if direction:
+        where_clause += ' AND direction = ?'
+        params.append(direction)
+    
+    if session_id:
+        where_clause += ' AND session_id = ?'
+        params.append(session_id)
+    
+    # One grouped pass over the covering index, in index order so no sort is needed
+    rows = conn.execute(f'''SELECT direction,
+        COUNT(*) as total,
+        SUM(correct = 1) as correct,
+        SUM(CASE WHEN correct = 1 AND answer_time_ms > 0 THEN answer_time_ms END) as correct_ms,
+        COUNT(CASE WHEN correct = 1 AND answer_time_ms > 0 THEN 1 END) as timed_correct,
+        SUM(CASE WHEN correct = 0 AND answer_time_ms > 0 THEN answer_time_ms END) as incorrect_ms,
+        COUNT(CASE WHEN correct = 0 AND answer_time_ms > 0 THEN 1 END) as timed_incorrect,
+        MIN(CASE WHEN answer_time_ms > 0 THEN answer_time_ms END) as fastest_time,
+        MAX(CASE WHEN answer_time_ms > 0 THEN answer_time_ms END) as slowest_time
+        FROM progress {where_clause}
+        GROUP BY direction''', params).fetchall()
+    
+    total = correct = correct_ms = timed_correct = incorrect_ms = timed_incorrect = 0
+    fastest_time = slowest_time = None
+    by_direction = {}
+    for row in rows:
+        total += row['total']
+        correct += row['correct'] or 0
+        correct_ms += row['correct_ms'] or 0
+        timed_correct += row['timed_correct']
+        incorrect_ms += row['incorrect_ms'] or 0
+        timed_incorrect += row['timed_incorrect']
+        if row['fastest_time'] is not None:
+            fastest_time = row['fastest_time'] if fastest_time is None else min(fastest_time, row['fastest_time'])
+            slowest_time = row['slowest_time'] if slowest_time is None else max(slowest_time, row['slowest_time'])
+        by_direction[row['direction']] = (row['total'], row['correct'] or 0)
+    
+    # Recent progress (last 7 days) covers every attempt, not only the latest per card.
+    # Without a session filter it is read from the daily rollups; sessions are short,
+    # so the session view aggregates its slice of the answer log directly.
+    since_day = today - 7
+    recent_where = 'WHERE username = ?'
+    recent_params = [username]
+    if direction:
+        direction_id = _direction_ids.get(direction) or _lookup_direction_id(conn, direction)
+        recent_where += ' AND direction_id = ?'
+        recent_params.append(direction_id)
+    if session_id:
+        recent_where += ' AND session_id = ? AND answered_at >= ?'
+        recent_params.extend([session_id, since_day * 86400])
+        recent = conn.execute(f'''SELECT answered_at / 86400 as day, COUNT(*) as total, SUM(correct) as correct,
+                                SUM(CASE WHEN correct = 1 THEN answer_time_ms ELSE 0 END) as correct_ms,
+                                SUM(CASE WHEN correct = 1 THEN 0 ELSE answer_time_ms END) as incorrect_ms
+                                FROM answer_log {recent_where}
+                                GROUP BY day ORDER BY day''', recent_params).fetchall()
+    else:
+        recent_where += ' AND day >= ?'
+        recent_params.append(since_day)
+        recent = conn.execute(f'''SELECT day, SUM(total) as total, SUM(correct) as correct,
+                                SUM(correct_ms) as correct_ms, SUM(incorrect_ms) as incorrect_ms
+                                FROM daily_rollups {recent_where}
+                                GROUP BY day HAVING SUM(total) > 0 ORDER BY day''', recent_params).fetchall()
+    
+    # Direction breakdown (only if no direction filter)
+    direction_stats = {}
+    if not direction:
+        for dir_name in DIRECTIONS:
+            dir_total, dir_correct = by_direction.get(dir_name, (0, 0))
+            direction_stats[_direction_key(dir_name)] = {
+                'total': dir_total,
+                'correct': dir_correct,
+                'percentage': _percentage(dir_correct, dir_total)
+            }
+    
+    return {
+        'total_answered': total,
+        'total_correct': correct,
+        'overall_percentage': _percentage(correct, total),
+        'avg_correct_time': _average(correct_ms, timed_correct),
+        'avg_incorrect_time': _average(incorrect_ms, timed_incorrect),
+        'fastest_time': fastest_time or 0,
+        'slowest_time': slowest_time or 0,
+        **direction_stats,
+        'recent_progress': [{
+            'date': _day_to_date(row['day']),
+            'total': row['total'],
+            'correct': row['correct'] or 0,
+            'percentage': _percentage(row['correct'] or 0, row['total']),
+            'avg_correct_time': _average(row['correct_ms'] or 0, row['correct'] or 0),
+            'avg_incorrect_time': _average(row['incorrect_ms'] or 0, row['total'] - (row['correct'] or 0))
+        } for row in recent]
+    }
+
+def iter_progress_rows(username, direction=None, session_id=None, start_date=None, end_date=None, batch_size=500):
+    """Yield a user's progress rows in batches from one cursor, so memory stays flat for any history size.
+
+    start_date and end_date are inclusive 'YYYY-MM-DD' bounds on answered_at. The cursor stays
+    open for as long as the caller streams, so it gets a connection of its own rather than
+    holding one of the pool's.
+    """
+    flush_pending_writes(username)
+    where_clause = 'WHERE username = ?'
+    params = [username]
+    if direction:
+        where_clause += ' AND direction = ?'
+        params.append(direction)
+    if session_id:
+        where_clause += ' AND session_id = ?'
+        params.append(session_id)
+    if start_date:
+        where_clause += ' AND answered_at >= date(?)'
+        params.append(start_date)
+    if end_date:
+        where_clause += " AND answered_at < date(?, '+1 day')"
+        params.append(end_date)
+    
+    conn = get_pool().connect_unpooled()
+    try:
+        cursor = conn.execute(f'''SELECT character, direction, correct, answer_time_ms, session_id, answered_at
+                                 FROM progress {where_clause} ORDER BY direction, answered_at''', params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        conn.close()
 
+@timed_db_call
 def get_current_session_id(username):
+    flush_pending_writes(username)
     with get_db() as conn:
         result = conn.execute('SELECT session_id FROM progress WHERE username = ? ORDER BY answered_at DESC LIMIT 1', (username,)).fetchone()
         return result['session_id'] if result else None
\ No newline at end of file
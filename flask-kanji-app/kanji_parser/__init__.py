@@ -0,0 +1,10 @@
+"""Parser for japanese_characters.txt shared by the Flask app, parse_kanji.py and the Streamlit app.
+
+`load_deck(path)` returns every entry as a KanjiRecord and caches the parsed deck on
+disk, keyed by the sha256 of the source file, so later loads skip parsing.
+"""
+from .cache import CACHE_VERSION, Deck, load_deck, parse_bytes
+from .records import KanjiRecord, iter_records, parse_file, parse_record
+
+__all__ = ['CACHE_VERSION', 'Deck', 'KanjiRecord', 'iter_records', 'load_deck', 'parse_bytes', 'parse_file',
+           'parse_record']
@@ -0,0 +1,71 @@
+import hashlib
+import io
+import os
+import pickle
+from typing import NamedTuple
+
+from .records import KanjiRecord, iter_records
+
+# Bump whenever KanjiRecord or the tokenizer changes what a cached deck would contain
+CACHE_VERSION = 1
+
+# Where parsed decks are stored; defaults to .kanji_cache next to the source file
+CACHE_DIR = os.environ.get('KANJI_CACHE_DIR')
+
+
+class Deck(NamedTuple):
+    digest: str      # sha256 of the source file
+    records: tuple   # KanjiRecord entries in file order
+
+
+def _cache_path(path, digest, cache_dir):
+    cache_dir = cache_dir or CACHE_DIR or os.path.join(os.path.dirname(os.path.abspath(path)), '.kanji_cache')
+    name = f"{os.path.basename(path)}.{digest[:32]}.v{CACHE_VERSION}.pickle"
+    return os.path.join(cache_dir, name)
+
+
+def _read_cache(cache_path, digest):
+    try:
+        with open(cache_path, 'rb') as f:
+            version, cached_digest, rows = pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError, ValueError, TypeError):
+        return None
+    if version != CACHE_VERSION or cached_digest != digest:
+        return None
+    return tuple(KanjiRecord._make(row) for row in rows)
+
+
+def _write_cache(cache_path, digest, records):
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            # Plain tuples, so the artifact does not depend on where KanjiRecord is imported from
+            pickle.dump((CACHE_VERSION, digest, [tuple(r) for r in records]), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+        # Decks of earlier versions of the file are never read again
+        prefix = os.path.basename(cache_path).rsplit('.', 3)[0]
+        for name in os.listdir(os.path.dirname(cache_path)):
+            stale = os.path.join(os.path.dirname(cache_path), name)
+            if name.startswith(prefix + '.') and name.endswith('.pickle') and stale != cache_path:
+                os.remove(stale)
+    except OSError as e:
+        # A read-only checkout still works, it just parses every time
+        print(f"Error writing kanji cache {cache_path}: {e}")
+
+
+def parse_bytes(content):
+    return tuple(iter_records(io.TextIOWrapper(io.BytesIO(content), encoding='utf-8', newline='')))
+
+
+def load_deck(path, cache_dir=None):
+    """Parsed records of path, from the cache when one exists for the file's current content"""
+    with open(path, 'rb') as f:
+        content = f.read()
+    digest = hashlib.sha256(content).hexdigest()
+    cache_path = _cache_path(path, digest, cache_dir)
+    records = _read_cache(cache_path, digest)
+    if records is None:
+        records = parse_bytes(content)
+        _write_cache(cache_path, digest, records)
+    return Deck(digest, records)
@@ -0,0 +1,90 @@
+import csv
+from typing import NamedTuple
+
+# Each line is `meaning<TAB>"record"`, where the quoted record holds tab-separated
+# sections in a fixed order:
+#   0 keyword   2 character   4 Lesson: .. Frame: .. Strokes: ..   5 Constituents: ..
+#   7 first story   8 primitive note   10 second story   12 On-Yomi: .. Kun-Yomi: ..
+#   13 Examples: .. (absent when there are none)
+KEYWORD, CHARACTER, INFO, CONSTITUENTS, STORY1, PRIMITIVE, STORY2, READINGS, EXAMPLES = 0, 2, 4, 5, 7, 8, 10, 12, 13
+
+# Labels of the `Lesson: 1   Frame: 1   Strokes: 1   —   Jouyou Grade: 1   JLPT: 5` section
+INFO_LABELS = {'Lesson': 'lesson', 'Frame': 'frame', 'Strokes': 'strokes', 'Jouyou Grade': 'grade', 'JLPT': 'jlpt'}
+
+
+class KanjiRecord(NamedTuple):
+    number: int          # 1-based line number in the source file
+    character: str
+    meaning: str
+    keyword: str
+    lesson: str
+    frame: str
+    strokes: str
+    grade: str
+    jlpt: str
+    constituents: str
+    story1: str
+    primitive: str
+    story2: str
+    on_yomi: str
+    kun_yomi: str
+    examples: str
+
+
+def _after_label(section, label):
+    """Text following label in section, or '' if the section does not start with it"""
+    section = section.strip()
+    if section.startswith(label):
+        return section[len(label):].strip()
+    return ''
+
+
+def parse_record(number, meaning, record):
+    """KanjiRecord from an entry's meaning column and its unquoted record, or None if malformed"""
+    sections = record.split('\t')
+    if len(sections) <= READINGS:
+        return None
+    character = sections[CHARACTER].strip()
+    if not character:
+        return None
+
+    info = dict.fromkeys(INFO_LABELS.values(), '')
+    for item in sections[INFO].split('   '):
+        label, _, value = item.partition(':')
+        field = INFO_LABELS.get(label.strip())
+        if field:
+            info[field] = value.strip()
+
+    on_yomi, _, kun_yomi = _after_label(sections[READINGS], 'On-Yomi:').partition('Kun-Yomi:')
+
+    return KanjiRecord(
+        number=number,
+        character=character,
+        meaning=meaning.strip(),
+        keyword=sections[KEYWORD].strip(),
+        constituents=_after_label(sections[CONSTITUENTS], 'Constituents:'),
+        story1=sections[STORY1].strip(),
+        primitive=sections[PRIMITIVE].strip(),
+        story2=sections[STORY2].strip(),
+        on_yomi=on_yomi.strip(),
+        kun_yomi=kun_yomi.strip(),
+        examples=_after_label(sections[EXAMPLES], 'Examples:') if len(sections) > EXAMPLES else '',
+        **info,
+    )
+
+
+def iter_records(lines):
+    """Yield a KanjiRecord per entry from an iterable of lines, such as an open text file"""
+    # The record column is CSV-quoted ("" escapes a quote), so let csv undo the quoting
+    for i, row in enumerate(csv.reader(lines, delimiter='\t')):
+        if len(row) < 2:
+            continue
+        entry = parse_record(i + 1, row[0], row[1])
+        if entry:
+            yield entry
+
+
+def parse_file(path):
+    """All records in path, parsed without the cache"""
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        return list(iter_records(f))
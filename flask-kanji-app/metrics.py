@@ -0,0 +1,164 @@
+import bisect
+import functools
+import threading
+import time
+
+# Upper bounds in seconds; quiz requests are mostly a few milliseconds, exports and logins take longer
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Signed session cookies grow with whatever is kept in the session
+SIZE_BUCKETS = (64, 128, 256, 512, 1024, 2048, 4096)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues, amount=1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for labelvalues, value in values:
+            lines.append(f"{self.name}{_labels(self.labelnames, labelvalues)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram; observe() is a bisect and a few additions under a lock"""
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._series = {}  # labelvalues -> [per-bucket counts (last is +Inf), sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labelvalues):
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][position] += 1
+            series[1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((labelvalues, list(counts), total) for labelvalues, (counts, total) in self._series.items())
+        for labelvalues, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labelvalues, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labelvalues)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labelvalues)} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """Read when scraped: func returns a number, or a dict of label value tuples to numbers.
+
+    type='counter' exposes totals that another component already keeps.
+    """
+
+    def __init__(self, name, help, func, labelnames=(), type='gauge'):
+        self.name = name
+        self.help = help
+        self.func = func
+        self.labelnames = labelnames
+        self.type = type
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        try:
+            values = self.func()
+        except Exception as e:
+            print(f"Error reading gauge {self.name}: {e}")
+            return lines
+        if not isinstance(values, dict):
+            values = {(): values}
+        for labelvalues, value in sorted(values.items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, labelvalues)} {_number(value)}")
+        return lines
+
+
+_registry = []
+_registry_lock = threading.Lock()
+
+
+def register(metric):
+    with _registry_lock:
+        _registry.append(metric)
+    return metric
+
+
+def render():
+    """Every registered metric in the Prometheus text exposition format"""
+    with _registry_lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+request_seconds = register(Histogram('kanji_request_duration_seconds', 'Time to handle a request, by endpoint',
+                                     ('endpoint',)))
+requests_total = register(Counter('kanji_requests_total', 'Requests handled, by endpoint, method and status',
+                                  ('endpoint', 'method', 'status')))
+session_cookie_bytes = register(Histogram('kanji_session_cookie_bytes', 'Size of the session cookie sent by clients',
+                                          buckets=SIZE_BUCKETS))
+db_call_seconds = register(Histogram('kanji_db_call_duration_seconds', 'Time spent in database.py calls, by function',
+                                     ('function',)))
+db_call_errors = register(Counter('kanji_db_call_errors_total', 'database.py calls that raised, by function',
+                                  ('function',)))
+cache_requests = register(Counter('kanji_cache_requests_total', 'Cache lookups, by cache and result (hit or miss)',
+                                  ('cache', 'result')))
+
+
+def timed_db_call(func):
+    """Count calls to a database.py function and how long they take"""
+    name = func.__name__
+
+    @functools.wraps(func)
+    def call(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            db_call_errors.inc(name)
+            raise
+        finally:
+            db_call_seconds.observe(time.perf_counter() - start, name)
+    return call
+
+
+def cache_lookup(cache, hit):
+    cache_requests.inc(cache, 'hit' if hit else 'miss')
@@ -0,0 +1,126 @@
+import hashlib
+import hmac
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+import metrics
+
+# bcrypt cost factor for new hashes; logins rehash passwords stored with a different one
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', 12))
+# Threads that run bcrypt (it releases the GIL); 0 hashes inline on the request thread
+HASH_WORKERS = int(os.environ.get('HASH_WORKERS', 2))
+# Hashes allowed to wait for a worker before new logins are turned away
+HASH_MAX_PENDING = int(os.environ.get('HASH_MAX_PENDING', 32))
+# Seconds a request waits for a place in the queue
+HASH_QUEUE_TIMEOUT = float(os.environ.get('HASH_QUEUE_TIMEOUT', 5))
+
+
+class HasherBusy(Exception):
+    """Raised when the hashing queue stays full for HASH_QUEUE_TIMEOUT seconds"""
+
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def check_password(password, password_hash):
+    """Check a password against a bcrypt hash or a legacy unsalted sha256 hex digest.
+
+    The Streamlit user store imports this too, so both apps accept the same hashes.
+    """
+    if not password_hash.startswith('$2'):
+        # Unsalted sha256 digest imported from the Streamlit users.json
+        digest = hashlib.sha256(password.encode('utf-8')).hexdigest()
+        return hmac.compare_digest(password_hash.encode('utf-8'), digest.encode('utf-8'))
+    return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+
+
+def needs_rehash(password_hash, rounds=BCRYPT_ROUNDS):
+    """True for legacy digests and bcrypt hashes made with a different cost factor"""
+    if not password_hash.startswith('$2'):
+        return True
+    try:
+        return int(password_hash.split('$')[2]) != rounds
+    except (IndexError, ValueError):
+        return True
+
+
+class PasswordHasher:
+    """Runs bcrypt on a small thread pool so a burst of logins cannot occupy every request thread.
+
+    At most `workers` hashes run at once and `max_pending` more may wait; beyond that
+    callers block for up to `queue_timeout` seconds and then get HasherBusy.
+    """
+
+    def __init__(self, workers=HASH_WORKERS, max_pending=HASH_MAX_PENDING, queue_timeout=HASH_QUEUE_TIMEOUT,
+                 rounds=BCRYPT_ROUNDS):
+        self.workers = workers
+        self.rounds = rounds
+        self.queue_timeout = queue_timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bcrypt') if workers else None
+        self._slots = threading.BoundedSemaphore(workers + max_pending) if workers else None
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self._running = 0
+        self._stats = {'completed': 0, 'rejected': 0, 'max_queue_depth': 0, 'queue_seconds': 0.0,
+                       'hash_seconds': 0.0}
+
+    def _timed(self, func, args, submitted):
+        started = time.perf_counter()
+        with self._lock:
+            self._waiting -= 1
+            self._running += 1
+            self._stats['queue_seconds'] += started - submitted
+        try:
+            return func(*args)
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._stats['completed'] += 1
+                self._stats['hash_seconds'] += time.perf_counter() - started
+
+    def _run(self, func, *args):
+        if self._executor is None:
+            return func(*args)
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            with self._lock:
+                self._stats['rejected'] += 1
+            raise HasherBusy()
+        try:
+            with self._lock:
+                self._waiting += 1
+                self._stats['max_queue_depth'] = max(self._stats['max_queue_depth'], self._waiting)
+            return self._executor.submit(self._timed, func, args, time.perf_counter()).result()
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        return self._run(_hash, password, self.rounds)
+
+    def check(self, password, password_hash):
+        return self._run(check_password, password, password_hash)
+
+    def needs_rehash(self, password_hash):
+        return needs_rehash(password_hash, self.rounds)
+
+    def stats(self):
+        """Counters for monitoring: hashes waiting and running now, plus totals since start"""
+        with self._lock:
+            return dict(self._stats, waiting=self._waiting, running=self._running, workers=self.workers)
+
+
+hasher = PasswordHasher()
+
+metrics.register(metrics.Gauge('kanji_password_hash_queue', 'Password hashes waiting for or running on the pool',
+                               lambda: {(state,): hasher.stats()[state] for state in ('waiting', 'running')},
+                               ('state',)))
+metrics.register(metrics.Gauge('kanji_password_hashes_total', 'Password hashes by outcome',
+                               lambda: {(outcome,): hasher.stats()[outcome] for outcome in ('completed', 'rejected')},
+                               ('outcome',), type='counter'))
+metrics.register(metrics.Gauge('kanji_password_hash_seconds_total', 'Seconds password hashes spent queued and hashing',
+                               lambda: {(phase,): hasher.stats()[f"{phase}_seconds"] for phase in ('queue', 'hash')},
+                               ('phase',), type='counter'))
@@ -0,0 +1,204 @@
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from metrics import cache_lookup
+
+try:
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.cidfonts import UnicodeCIDFont
+    from reportlab.pdfbase.ttfonts import TTFont
+    from reportlab.pdfgen import canvas
+except ImportError:
+    canvas = None
+
+PDF_FONT_PATH = os.environ.get('PDF_FONT_PATH', 'NOTOSANSJP-THIN.TTF')
+PDF_WORKERS = int(os.environ.get('PDF_WORKERS', 2))
+# Seconds a request waits for its render before answering 202 and letting the client retry
+PDF_WAIT_SECONDS = float(os.environ.get('PDF_WAIT_SECONDS', 10))
+# Rendered documents kept in memory, by total size
+PDF_CACHE_BYTES = int(os.environ.get('PDF_CACHE_BYTES', 32 * 1024 * 1024))
+# Decks with at least this many rows are rendered to disk and streamed back in chunks
+PDF_STREAM_ROWS = int(os.environ.get('PDF_STREAM_ROWS', 2000))
+PDF_CACHE_DIR = os.environ.get('PDF_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'kanji-pdf'))
+# Rendered documents kept in PDF_CACHE_DIR, by total size
+PDF_CACHE_DISK_BYTES = int(os.environ.get('PDF_CACHE_DISK_BYTES', 512 * 1024 * 1024))
+PDF_CHUNK_SIZE = 64 * 1024
+
+FALLBACK_FONT = 'HeiseiKakuGo-W5'
+
+_font_name = None
+_font_lock = threading.Lock()
+
+
+def available():
+    return canvas is not None
+
+
+def register_font():
+    """Register the Japanese font once per process and return its name"""
+    global _font_name
+    if _font_name is None:
+        with _font_lock:
+            if _font_name is None:
+                try:
+                    pdfmetrics.registerFont(TTFont('Noto Sans JP Thin', PDF_FONT_PATH))
+                    _font_name = 'Noto Sans JP Thin'
+                except Exception as e:
+                    # The built-in CID font covers Japanese without shipping a TTF
+                    print(f"Error loading PDF font {PDF_FONT_PATH}, using {FALLBACK_FONT}: {e}")
+                    pdfmetrics.registerFont(UnicodeCIDFont(FALLBACK_FONT))
+                    _font_name = FALLBACK_FONT
+    return _font_name
+
+
+def render(rows, out):
+    """Draw (number, character, meaning, correct) rows to the file object out"""
+    font = register_font()
+    pdf = canvas.Canvas(out, pagesize=letter)
+    pdf.setFont(font, 14)
+    pdf.drawString(100, 750, "Japanese Characters and Meanings")
+
+    y_position = 720
+    for char_number, char, meaning, correct in rows:
+        status = "Correct" if correct == 1 else "Incorrect"
+        pdf.drawString(100, y_position, f"({int(char_number):6}) {char:<6}: {meaning:<50} - {status}")
+        y_position -= 20
+        if y_position < 40:  # Create a new page if space runs out
+            pdf.showPage()
+            pdf.setFont(font, 14)
+            y_position = 750
+
+    pdf.save()
+
+
+class PdfExporter:
+    """Renders progress PDFs on a worker pool and caches them per (username, direction, version).
+
+    Keys start with (username, direction); anything after that, such as the progress
+    version, only has to change when the document would. Small documents are kept in
+    memory under a byte budget. Decks of PDF_STREAM_ROWS rows or more are written to
+    PDF_CACHE_DIR, under a budget of their own, and streamed back from disk in chunks.
+    """
+
+    def __init__(self, workers=PDF_WORKERS, cache_bytes=PDF_CACHE_BYTES, cache_dir=PDF_CACHE_DIR,
+                 disk_bytes=PDF_CACHE_DISK_BYTES):
+        self.cache_bytes = cache_bytes
+        self.cache_dir = cache_dir
+        self.disk_bytes = disk_bytes
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='pdf')
+        self._cache = OrderedDict()  # key -> (bytes, or the path of a document on disk; its size)
+        self._cached_bytes = 0
+        self._cached_disk_bytes = 0
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def _path_for(self, key):
+        name = hashlib.sha256(repr(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f"{name}.pdf")
+
+    def _store(self, key, document, size):
+        with self._lock:
+            self._in_flight.pop(key, None)
+            # An older version for the same user and direction can no longer be requested
+            for old_key in [k for k in self._cache if k[:2] == key[:2]]:
+                self._evict(old_key)
+            self._cache[key] = (document, size)
+            if isinstance(document, bytes):
+                self._cached_bytes += size
+            else:
+                self._cached_disk_bytes += size
+            # Least recently used first; the new document stays even if it is over budget on its own
+            for old_key in [k for k in self._cache if k != key]:
+                if self._cached_bytes <= self.cache_bytes and self._cached_disk_bytes <= self.disk_bytes:
+                    break
+                on_disk = not isinstance(self._cache[old_key][0], bytes)
+                if (self._cached_disk_bytes > self.disk_bytes) if on_disk else (self._cached_bytes > self.cache_bytes):
+                    self._evict(old_key)
+
+    def _evict(self, key):
+        document, size = self._cache.pop(key)
+        if isinstance(document, bytes):
+            self._cached_bytes -= size
+        else:
+            self._cached_disk_bytes -= size
+            try:
+                os.remove(document)
+            except OSError:
+                pass
+
+    def _render(self, key, rows):
+        try:
+            if len(rows) >= PDF_STREAM_ROWS:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                path = self._path_for(key)
+                # Render beside the final name so readers never see a partial file
+                fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.part')
+                with os.fdopen(fd, 'wb') as f:
+                    render(rows, f)
+                os.replace(tmp_path, path)
+                document, size = path, os.path.getsize(path)
+            else:
+                buffer = BytesIO()
+                render(rows, buffer)
+                document = buffer.getvalue()
+                size = len(document)
+        except Exception:
+            with self._lock:
+                self._in_flight.pop(key, None)
+            raise
+        self._store(key, document, size)
+        return document
+
+    def get(self, key, load_rows):
+        """Cached document for key, or a future rendering the rows from load_rows()"""
+        with self._lock:
+            document = self._cache.get(key, (None,))[0]
+            cache_lookup('pdf', document is not None)
+            if document is not None:
+                self._cache.move_to_end(key)
+                return document, None
+            future = self._in_flight.get(key)
+            if future is not None:
+                return None, future
+        rows = load_rows()
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is None:
+                future = self._in_flight[key] = self._executor.submit(self._render, key, rows)
+        return None, future
+
+
+    def iter_document(self, key, document, load_rows):
+        """Body of a document from get() as an iterable of chunks.
+
+        A document on disk may have been evicted since get() returned its path; it is then
+        rendered again. The file is opened under the lock _evict removes files under, and
+        an open file stays readable after it is removed.
+        """
+        while not isinstance(document, bytes):
+            with self._lock:
+                try:
+                    return _file_chunks(open(document, 'rb'))
+                except FileNotFoundError:
+                    # Removed behind the cache's back, e.g. by a tmp cleaner
+                    if self._cache.get(key, (None,))[0] == document:
+                        self._evict(key)
+            document, future = self.get(key, load_rows)
+            if document is None:
+                document = future.result()
+        return [document]
+
+
+def _file_chunks(f):
+    with f:
+        while True:
+            chunk = f.read(PDF_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
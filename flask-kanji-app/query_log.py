@@ -0,0 +1,225 @@
+"""Slow-query log for the database layer, and a report over it.
+
+Pooled connections use ProfiledConnection, whose cursors time each statement from
+execute to its last fetched row. Statements slower than SLOW_QUERY_MS are appended
+to SLOW_QUERY_LOG as JSON lines with their EXPLAIN QUERY PLAN, flagging full-table
+scans and temporary sort B-trees. Parameters are not logged, only their count.
+
+    python query_log.py [slow_queries.log] [--top 20]
+
+prints the logged statements grouped by SQL, worst total time first.
+"""
+import argparse
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import quote
+
+import metrics
+
+# Statements slower than this are logged; 0 logs every statement, a negative value turns the hook off
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 100))
+SLOW_QUERY_LOG = os.environ.get('SLOW_QUERY_LOG', 'slow_queries.log')
+
+# "SCAN progress" (or "SCAN TABLE progress" before SQLite 3.36) reads every row; "SCAN x USING INDEX" does not
+FULL_SCAN_PATTERN = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$')
+TEMP_BTREE_PATTERN = re.compile(r'USE TEMP B-TREE')
+
+slow_queries = metrics.register(metrics.Counter('kanji_slow_queries_total',
+                                                'Statements slower than SLOW_QUERY_MS, by whether they scan a table',
+                                                ('full_scan',)))
+
+_plans = {}
+_log_lock = threading.Lock()
+
+
+def enabled():
+    return SLOW_QUERY_MS >= 0
+
+
+def normalize_sql(sql):
+    return ' '.join(sql.split())
+
+
+def explain(path, sql, params):
+    """(plan lines, fully scanned tables, uses a temp B-tree), cached per statement text"""
+    key = (path, sql)
+    plan = _plans.get(key)
+    if plan is None:
+        # A separate read-only connection, so the pooled one is never used from two places at once
+        conn = sqlite3.connect(f"file:{quote(os.path.abspath(path))}?mode=ro", uri=True)
+        try:
+            lines = [row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql, params)]
+        finally:
+            conn.close()
+        scans = [m.group(1) for m in map(FULL_SCAN_PATTERN.match, lines) if m]
+        plan = _plans[key] = (lines, scans, any(TEMP_BTREE_PATTERN.search(line) for line in lines))
+    return plan
+
+
+def log_statement(path, sql, params, seconds, rows):
+    try:
+        lines, scans, temp_btree = explain(path, sql, params)
+    except sqlite3.Error as e:
+        lines, scans, temp_btree = [f"EXPLAIN failed: {e}"], [], False
+    slow_queries.inc('yes' if scans else 'no')
+    entry = {
+        'at': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime()),
+        'database': os.path.basename(path),
+        'ms': round(seconds * 1000, 3),
+        'rows': rows,
+        'sql': normalize_sql(sql),
+        'params': len(params),
+        'plan': lines,
+        'full_scan': scans,
+        'temp_btree': temp_btree,
+    }
+    with _log_lock:
+        with open(SLOW_QUERY_LOG, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+
+class ProfiledCursor(sqlite3.Cursor):
+    """Times a statement across execute and its fetches; reports it once the rows run out or it is dropped"""
+
+    _sql = None
+
+    def _start(self, sql, params):
+        self._finish()
+        self._sql = sql
+        self._params = params
+        self._seconds = 0.0
+        self._rows = 0
+
+    def _timed(self, func, *args):
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            self._seconds += time.perf_counter() - start
+
+    def _finish(self):
+        sql, self._sql = self._sql, None
+        if sql is not None and self._seconds * 1000 >= SLOW_QUERY_MS:
+            try:
+                log_statement(self.connection.path, sql, self._params, self._seconds, self._rows)
+            except Exception as e:
+                print(f"Error writing slow query log: {e}")
+
+    def execute(self, sql, parameters=()):
+        self._start(sql, parameters)
+        return self._timed(super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        if not isinstance(seq_of_parameters, (list, tuple)):
+            seq_of_parameters = list(seq_of_parameters)
+        # The plan is the same for every row, so it is explained with the first one
+        self._start(sql, seq_of_parameters[0] if seq_of_parameters else ())
+        return self._timed(super().executemany, sql, seq_of_parameters)
+
+    def fetchone(self):
+        row = self._timed(super().fetchone)
+        if row is None:
+            self._finish()
+        else:
+            self._rows += 1
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self._timed(super().fetchmany, self.arraysize if size is None else size)
+        self._rows += len(rows)
+        if not rows:
+            self._finish()
+        return rows
+
+    def fetchall(self):
+        rows = self._timed(super().fetchall)
+        self._rows += len(rows)
+        self._finish()
+        return rows
+
+    def __next__(self):
+        try:
+            row = self._timed(super().__next__)
+        except StopIteration:
+            self._finish()
+            raise
+        self._rows += 1
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        # Writes and single-row reads are usually never exhausted explicitly
+        self._finish()
+
+
+class ProfiledConnection(sqlite3.Connection):
+    def __init__(self, database, *args, **kwargs):
+        super().__init__(database, *args, **kwargs)
+        self.path = database
+
+    def cursor(self, factory=ProfiledCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def read_log(path):
+    with open(path, encoding='utf-8') as f:
+        for number, line in enumerate(f, 1):
+            try:
+                yield json.loads(line)
+            except ValueError:
+                print(f"Skipping malformed line {number} of {path}", file=sys.stderr)
+
+
+def report(entries, top=20):
+    """Statements grouped by SQL text, worst total time first"""
+    groups = defaultdict(lambda: {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'rows': 0})
+    for entry in entries:
+        group = groups[entry['sql']]
+        group['count'] += 1
+        group['total_ms'] += entry['ms']
+        group['max_ms'] = max(group['max_ms'], entry['ms'])
+        group['rows'] += entry.get('rows') or 0
+        group.update(plan=entry['plan'], full_scan=entry['full_scan'], temp_btree=entry['temp_btree'])
+    worst = sorted(groups.items(), key=lambda item: item[1]['total_ms'], reverse=True)[:top]
+    return [dict(group, sql=sql, mean_ms=group['total_ms'] / group['count']) for sql, group in worst]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Worst statements in the slow-query log, by total time')
+    parser.add_argument('log', nargs='?', default=SLOW_QUERY_LOG)
+    parser.add_argument('--top', type=int, default=20)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.log):
+        sys.exit(f"No slow-query log at {args.log}")
+    rows = report(read_log(args.log), args.top)
+    if not rows:
+        print('The slow-query log is empty')
+    for rank, row in enumerate(rows, 1):
+        flags = [f"FULL SCAN of {', '.join(row['full_scan'])}"] if row['full_scan'] else []
+        if row['temp_btree']:
+            flags.append('TEMP B-TREE')
+        print(f"{rank:>3}. total {row['total_ms']:10.1f} ms   {row['count']:6d} x   mean {row['mean_ms']:8.2f} ms"
+              f"   max {row['max_ms']:8.2f} ms   rows {row['rows']}" + (f"   [{'; '.join(flags)}]" if flags else ''))
+        print(f"     {row['sql'][:300]}")
+        for line in row['plan']:
+            print(f"       plan: {line}")
+
+
+if __name__ == '__main__':
+    main()
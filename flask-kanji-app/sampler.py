@@ -0,0 +1,78 @@
+import random
+
+
+class UnseenPool:
+    """Pool of unseen deck indices with O(1) draw, remove, add and reset.
+
+    This is a lazy Fisher-Yates array over range(deck_size): positions below
+    `size` hold the unseen indices. Only positions whose value was moved by a
+    swap are stored, so a fresh or reset pool costs nothing to build and the
+    serialized form grows with the number of answers, not the deck size.
+    """
+
+    def __init__(self, deck_size, size=None, swaps=()):
+        self.deck_size = deck_size
+        self.size = deck_size if size is None else size
+        self._values = {}     # position -> index, for moved positions only
+        self._positions = {}  # index -> position, inverse of _values
+        for position, index in swaps:
+            self._place(position, index)
+
+    def _value_at(self, position):
+        return self._values.get(position, position)
+
+    def _position_of(self, index):
+        return self._positions.get(index, index)
+
+    def _place(self, position, index):
+        if position == index:
+            self._values.pop(position, None)
+            self._positions.pop(index, None)
+        else:
+            self._values[position] = index
+            self._positions[index] = position
+
+    def _swap(self, a, b):
+        value_a, value_b = self._value_at(a), self._value_at(b)
+        self._place(a, value_b)
+        self._place(b, value_a)
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, index):
+        return 0 <= index < self.deck_size and self._position_of(index) < self.size
+
+    def draw(self, rng=random):
+        """Random unseen index without removing it, or None when the pool is empty"""
+        if self.size == 0:
+            return None
+        return self._value_at(rng.randrange(self.size))
+
+    def remove(self, index):
+        """Mark index as seen"""
+        if index not in self:
+            return False
+        self.size -= 1
+        self._swap(self._position_of(index), self.size)
+        return True
+
+    def add(self, index):
+        """Return a seen index to the pool, e.g. when an answer is undone"""
+        if not 0 <= index < self.deck_size or index in self:
+            return False
+        self._swap(self._position_of(index), self.size)
+        self.size += 1
+        return True
+
+    def reset(self):
+        self.size = self.deck_size
+        self._values = {}
+        self._positions = {}
+
+    def to_dict(self):
+        return {'deck_size': self.deck_size, 'size': self.size, 'swaps': list(self._values.items())}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['deck_size'], data['size'], data['swaps'])
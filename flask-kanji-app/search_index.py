@@ -0,0 +1,181 @@
+import bisect
+import heapq
+import re
+import threading
+from collections import defaultdict
+
+from metrics import cache_lookup
+
+# Score of a match in each field; prefix matches count for PREFIX_FACTOR of that
+FIELD_WEIGHTS = {'character': 100.0, 'meaning': 10.0, 'keyword': 8.0, 'reading': 6.0, 'constituent': 4.0}
+PREFIX_FACTOR = 0.5
+# Shorter words only match whole terms; a one-letter prefix would touch most of the index
+MIN_PREFIX_LENGTH = 2
+# Extra score when the query is the whole meaning or constituent rather than one word of it
+PHRASE_BONUS = 2.0
+
+MAX_RESULTS = 50
+
+WORD_PATTERN = re.compile(r"[\w']+")
+# Okurigana and affix markers in readings, e.g. ひと.つ or -ひと
+READING_MARKS = str.maketrans('', '', '.-')
+# Katakana ァ..ヶ fold onto hiragana ぁ..ゖ so either script finds both kinds of reading
+KANA_FOLD = {code: code - 0x60 for code in range(0x30A1, 0x30F7)}
+KANJI_PATTERN = re.compile(r'[㐀-䶿一-鿿豈-﫿]')
+
+
+def fold_kana(text):
+    return text.translate(KANA_FOLD)
+
+
+def normalize(text):
+    """Lower-cased words with kana folded to hiragana, as stored in the index"""
+    return [fold_kana(word) for word in WORD_PATTERN.findall(text.lower().translate(READING_MARKS))]
+
+
+def _split_list(text):
+    return [item.strip() for item in re.split(r'[、,]', text) if item.strip()]
+
+
+def _rank(item):
+    # Best score first, then file order (entry indices follow the file)
+    index, score = item
+    return (-score, index)
+
+
+def _discounted(postings):
+    # Lazily, so a merge that stops early never touches the rest of a long posting list
+    for index, score in postings:
+        yield index, score * PREFIX_FACTOR
+
+
+class SearchIndex:
+    """Inverted index over a catalog's meanings, keywords, readings and constituents.
+
+    Postings map each normalized term to (entry index, score) pairs, best score first.
+    Terms are also kept sorted so prefix queries are a bisect plus a scan of the matching
+    run. A one-word query merges the sorted postings lazily and stops after `limit`
+    entries, so its cost follows the result size rather than the deck size.
+    """
+
+    def __init__(self, records):
+        self.records = records
+        postings = defaultdict(dict)
+        self.by_character = {}
+
+        def add(term, index, score):
+            entry = postings[term]
+            if entry.get(index, 0) < score:
+                entry[index] = score
+
+        for index, record in enumerate(records):
+            self.by_character.setdefault(record.character, index)
+            for field, text in (('meaning', record.meaning), ('keyword', record.keyword)):
+                words = normalize(text)
+                for word in words:
+                    add(word, index, FIELD_WEIGHTS[field])
+                if len(words) > 1:
+                    add(' '.join(words), index, FIELD_WEIGHTS[field] * PHRASE_BONUS)
+            for reading in _split_list(record.on_yomi) + _split_list(record.kun_yomi):
+                for word in normalize(reading):
+                    add(word, index, FIELD_WEIGHTS['reading'])
+            for constituent in _split_list(record.constituents):
+                words = normalize(constituent)
+                for word in words:
+                    add(word, index, FIELD_WEIGHTS['constituent'])
+                if len(words) > 1:
+                    add(' '.join(words), index, FIELD_WEIGHTS['constituent'] * PHRASE_BONUS)
+
+        self.postings = {term: tuple(sorted(entries.items(), key=_rank)) for term, entries in postings.items()}
+        self.terms = sorted(self.postings)
+
+    def _prefix_terms(self, term):
+        """Indexed terms that extend term, if it is long enough for prefix matching"""
+        if len(term) < MIN_PREFIX_LENGTH:
+            return []
+        terms = self.terms
+        position = bisect.bisect_left(terms, term)
+        if position < len(terms) and terms[position] == term:
+            position += 1
+        end = position
+        while end < len(terms) and terms[end].startswith(term):
+            end += 1
+        return terms[position:end]
+
+    def _term_scores(self, term):
+        """Scores for entries matching term exactly or, at a discount, as a prefix"""
+        scores = dict(self.postings.get(term, ()))
+        for prefix_term in self._prefix_terms(term):
+            for index, score in self.postings[prefix_term]:
+                score *= PREFIX_FACTOR
+                if scores.get(index, 0) < score:
+                    scores[index] = score
+        return scores
+
+    def _top_for_term(self, term, limit):
+        runs = [self.postings.get(term, ())]
+        for prefix_term in self._prefix_terms(term):
+            runs.append(_discounted(self.postings[prefix_term]))
+        best = []
+        seen = set()
+        # Runs are each sorted best first, so an entry's first appearance carries its best score
+        for index, score in heapq.merge(*runs, key=_rank):
+            if index not in seen:
+                seen.add(index)
+                best.append((index, score))
+                if len(best) == limit:
+                    break
+        return best
+
+    def search(self, query, limit=MAX_RESULTS):
+        """(record, score) pairs for entries matching every word of query, best first"""
+        words = normalize(KANJI_PATTERN.sub(' ', query))
+        if len(words) == 1 and not KANJI_PATTERN.search(query):
+            return [(self.records[index], score) for index, score in self._top_for_term(words[0], limit)]
+
+        scores = {}
+        # Kanji in the query match their own entries directly
+        for char in KANJI_PATTERN.findall(query):
+            index = self.by_character.get(char)
+            if index is not None:
+                scores[index] = scores.get(index, 0) + FIELD_WEIGHTS['character']
+
+        if words:
+            matched = None
+            for word in words:
+                term_scores = self._term_scores(word)
+                if matched is None:
+                    matched = term_scores
+                else:
+                    matched = {index: score + term_scores[index] for index, score in matched.items()
+                               if index in term_scores}
+                if not matched:
+                    break
+            # The whole query as a phrase ranks exact meanings above entries that merely share its words
+            if len(words) > 1:
+                for index, score in self.postings.get(' '.join(words), ()):
+                    if index in matched:
+                        matched[index] += score
+            for index, score in matched.items():
+                scores[index] = scores.get(index, 0) + score
+
+        best = heapq.nsmallest(limit, scores.items(), key=_rank)
+        return [(self.records[index], score) for index, score in best]
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_search_index(catalog):
+    """Index for the catalog's current contents, rebuilt only when its digest changes"""
+    catalog.refresh()
+    index = _indexes.get(catalog.file_path)
+    cache_lookup('search_index', index is not None and index[0] == catalog.digest)
+    if index is None or index[0] != catalog.digest:
+        with _indexes_lock:
+            index = _indexes.get(catalog.file_path)
+            if index is None or index[0] != catalog.digest:
+                digest, records = catalog.digest, catalog.records
+                index = _indexes[catalog.file_path] = (digest, SearchIndex(records))
+    return index[1]
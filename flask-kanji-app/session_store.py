@@ -0,0 +1,166 @@
+import copy
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import cache_lookup
+
+# Quiz state lives here instead of in the signed cookie; the cookie only keeps the key.
+SESSION_STORE = os.environ.get('SESSION_STORE', 'sqlite')
+SESSION_DATABASE = os.environ.get('SESSION_DATABASE', 'sessions.db')
+SESSION_TTL = int(os.environ.get('SESSION_TTL', 7 * 24 * 3600))
+SESSION_MAX_ENTRIES = int(os.environ.get('SESSION_MAX_ENTRIES', 10000))
+
+# update() calls on keys that hash to the same stripe wait for each other
+UPDATE_LOCK_STRIPES = 64
+
+
+class MemorySessionStore:
+    """Per-process store with LRU eviction and a TTL; only suitable for a single worker"""
+
+    def __init__(self, max_entries=SESSION_MAX_ENTRIES, ttl=SESSION_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._update_locks = [threading.Lock() for _ in range(UPDATE_LOCK_STRIPES)]
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None and item[0] < time.time():
+                del self._entries[key]
+                item = None
+            cache_lookup('quiz_session', item is not None)
+            if item is None:
+                return None
+            self._entries.move_to_end(key)
+            return item[1]
+
+    def set(self, key, state):
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, state)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def update(self, key, change):
+        """Atomically replace the state for key with change(state or None), which returns (state, result)
+
+        change works on a copy, so readers holding the stored state never see it half-changed.
+        """
+        with self._update_locks[hash(key) % UPDATE_LOCK_STRIPES]:
+            state = self.get(key)
+            state, result = change(copy.deepcopy(state))
+            self.set(key, state)
+            return result
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class SqliteSessionStore:
+    """Store shared by every gunicorn worker on the host through a SQLite file"""
+
+    # Expired rows are purged once every this many writes
+    PURGE_EVERY = 500
+
+    def __init__(self, path=SESSION_DATABASE, ttl=SESSION_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        self._writes = 0
+        with self._connect() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS quiz_sessions (
+                    key TEXT PRIMARY KEY,
+                    state TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    version INTEGER NOT NULL DEFAULT 0
+                )
+            ''')
+            # Stores created before update() used optimistic versioning lack the column
+            columns = [row[1] for row in conn.execute('PRAGMA table_info(quiz_sessions)')]
+            if 'version' not in columns:
+                conn.execute('ALTER TABLE quiz_sessions ADD COLUMN version INTEGER NOT NULL DEFAULT 0')
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        return self._read(key)[0]
+
+    def _read(self, key):
+        """(state, version) for key; the state is None once expired, the version None if there is no row"""
+        row = self._connect().execute('SELECT state, expires_at, version FROM quiz_sessions WHERE key = ?',
+                                      (key,)).fetchone()
+        found = row is not None and row[1] >= time.time()
+        cache_lookup('quiz_session', found)
+        return (json.loads(row[0]) if found else None), (row[2] if row is not None else None)
+
+    def set(self, key, state):
+        conn = self._connect()
+        with conn:
+            conn.execute('''INSERT INTO quiz_sessions (key, state, expires_at) VALUES (?, ?, ?)
+                            ON CONFLICT (key) DO UPDATE SET state = excluded.state, expires_at = excluded.expires_at,
+                                version = version + 1''', (key, self._dumps(state), time.time() + self.ttl))
+        self._purge(conn)
+
+    def update(self, key, change):
+        """Atomically replace the state for key with change(state or None), which returns (state, result)
+
+        Optimistic: change runs outside any transaction, and the write only lands if the
+        row's version is still the one read, otherwise change runs again on the newer
+        state. Updates to one key from any thread or worker process therefore apply one
+        after another, while other keys only wait for the single-row write itself.
+        change must have no side effects beyond the state, as it may run more than once.
+        """
+        conn = self._connect()
+        while True:
+            state, version = self._read(key)
+            state, result = change(state)
+            with conn:
+                if version is None:
+                    written = conn.execute('''INSERT INTO quiz_sessions (key, state, expires_at) VALUES (?, ?, ?)
+                                              ON CONFLICT (key) DO NOTHING''',
+                                           (key, self._dumps(state), time.time() + self.ttl)).rowcount
+                else:
+                    written = conn.execute('''UPDATE quiz_sessions SET state = ?, expires_at = ?, version = version + 1
+                                              WHERE key = ? AND version = ?''',
+                                           (self._dumps(state), time.time() + self.ttl, key, version)).rowcount
+            if written:
+                break
+        self._purge(conn)
+        return result
+
+    def _dumps(self, state):
+        return json.dumps(state, separators=(',', ':'))
+
+    def _purge(self, conn):
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            with conn:
+                conn.execute('DELETE FROM quiz_sessions WHERE expires_at < ?', (time.time(),))
+
+    def delete(self, key):
+        conn = self._connect()
+        with conn:
+            conn.execute('DELETE FROM quiz_sessions WHERE key = ?', (key,))
+
+
+def create_session_store(kind=SESSION_STORE):
+    if kind == 'memory':
+        return MemorySessionStore()
+    if kind == 'sqlite':
+        return SqliteSessionStore()
+    raise ValueError(f"Unknown SESSION_STORE: {kind}")
@@ -0,0 +1,28 @@
+# SM-2 style spaced repetition scheduling for review mode
+
+DEFAULT_EASE = 2.5
+MIN_EASE = 1.3
+# Cards answered incorrectly come back within the same study session
+RELEARN_DELAY_SECONDS = 10 * 60
+DAY_SECONDS = 24 * 3600
+
+# The quiz only records correct/incorrect, so map those onto SM-2 answer qualities
+QUALITY_CORRECT = 4
+QUALITY_INCORRECT = 1
+
+
+def schedule(reps, interval_days, ease, correct, now):
+    """Next (reps, interval_days, ease, due_at) for a card after an answer at unix time now"""
+    quality = QUALITY_CORRECT if correct else QUALITY_INCORRECT
+    ease = max(MIN_EASE, ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+
+    if quality < 3:
+        return 0, 0.0, ease, now + RELEARN_DELAY_SECONDS
+
+    if reps == 0:
+        interval_days = 1.0
+    elif reps == 1:
+        interval_days = 6.0
+    else:
+        interval_days = interval_days * ease
+    return reps + 1, interval_days, ease, now + int(interval_days * DAY_SECONDS)
@@ -1,8 +1,29 @@
+// Cards fetched ahead so the next question never waits on the network
+const PREFETCH_SIZE = 5;
+const PREFETCH_LOW_WATER = 2;
+const ANSWER_RETRIES = 3;
+
+function newBatchId() {
+    if (window.crypto && crypto.randomUUID) {
+        return crypto.randomUUID();
+    }
+    return `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+}
+
 class KanjiQuiz {
     constructor() {
         this.currentCharacter = null;
         this.lastAnsweredCharacter = null;
         this.gameStarted = false;
+        this.cardQueue = [];
+        this.queueExhausted = false;
+        this.noMoreData = null;
+        this.refilling = null;
+        this.pendingAnswers = [];
+        this.outbox = [];
+        this.flushing = null;
+        this.clientSeq = 0;
+        this.shownAt = 0;
         this.init();
     }
 
@@ -33,6 +54,7 @@ class KanjiQuiz {
     async startGame() {
         const numChars = document.getElementById('numChars').value;
         const direction = document.querySelector('input[name="direction"]:checked').value;
+        const mode = document.querySelector('input[name="mode"]:checked').value;
         
         const startBtn = document.getElementById('startGame');
         setLoading(startBtn, true);
@@ -41,20 +63,27 @@ class KanjiQuiz {
             const response = await fetch('/start_game', {
                 method: 'POST',
                 headers: {'Content-Type': 'application/json'},
-                body: JSON.stringify({num_chars: parseInt(numChars), direction})
+                body: JSON.stringify({num_chars: parseInt(numChars), direction, mode})
             });
 
             if (response.ok) {
                 const data = await response.json();
+                this.cardQueue = [];
+                this.queueExhausted = false;
+                this.noMoreData = null;
                 if (data.no_more_characters) {
-                    this.showNoMoreCharacters();
+                    this.showNoMoreCharacters(data);
                 } else {
                     this.showCharacter(data);
+                    this.refillQueue();
                     this.gameStarted = true;
                     document.getElementById('gameSetup').style.display = 'none';
                     document.getElementById('quizInterface').style.display = 'block';
                     this.updateProgress();
                 }
+            } else {
+                const data = await response.json().catch(() => ({}));
+                showAlert(data.error || 'Error starting game', 'danger');
             }
         } catch (error) {
             showAlert('Error starting game', 'danger');
@@ -64,23 +93,45 @@ class KanjiQuiz {
         }
     }
 
-    async getNextCharacter() {
-        try {
-            const response = await fetch('/get_character');
-            const data = await response.json();
-            
-            if (data.no_more_characters) {
-                this.showNoMoreCharacters();
-            } else {
-                this.showCharacter(data);
+    refillQueue() {
+        if (this.refilling || this.queueExhausted || this.cardQueue.length >= PREFETCH_LOW_WATER) {
+            return this.refilling;
+        }
+        this.refilling = (async () => {
+            try {
+                const response = await fetch(`/get_character?count=${PREFETCH_SIZE}`);
+                const data = await response.json();
+                this.cardQueue.push(...data.cards);
+                if (data.cards.length === 0) {
+                    this.queueExhausted = true;
+                    this.noMoreData = data;
+                }
+            } catch (error) {
+                showAlert('Error getting next character', 'danger');
+            } finally {
+                this.refilling = null;
             }
-        } catch (error) {
-            showAlert('Error getting next character', 'danger');
+        })();
+        return this.refilling;
+    }
+
+    async getNextCharacter() {
+        if (this.cardQueue.length === 0) {
+            await this.refillQueue();
+        }
+        const next = this.cardQueue.shift();
+        if (next) {
+            this.showCharacter(next);
+            this.refillQueue();
+        } else {
+            this.currentCharacter = null;
+            this.showNoMoreCharacters(this.noMoreData || {});
         }
     }
 
     showCharacter(data) {
         this.currentCharacter = data;
+        this.shownAt = performance.now();
         const displayElement = document.getElementById('characterDisplay');
         const answerElement = document.getElementById('answerDisplay');
         
@@ -102,40 +153,67 @@ class KanjiQuiz {
     async answerQuestion(isCorrect) {
         if (!this.currentCharacter) return;
 
-        const correctBtn = document.getElementById('correctBtn');
-        const incorrectBtn = document.getElementById('incorrectBtn');
-        
-        correctBtn.disabled = true;
-        incorrectBtn.disabled = true;
+        // Answers are timed per card on the client and sent in batches in the background
+        this.pendingAnswers.push({
+            character: this.currentCharacter.character,
+            is_correct: isCorrect,
+            answer_time_ms: Math.round(performance.now() - this.shownAt),
+            client_seq: ++this.clientSeq
+        });
+        this.lastAnsweredCharacter = this.currentCharacter.character;
+        document.getElementById('undoBtn').style.display = 'block';
+        this.flushAnswers();
+        await this.getNextCharacter();
+    }
 
-        try {
-            const response = await fetch('/answer', {
-                method: 'POST',
-                headers: {'Content-Type': 'application/json'},
-                body: JSON.stringify({
-                    character: this.currentCharacter.character,
-                    is_correct: isCorrect
-                })
+    flushAnswers() {
+        if (!this.flushing) {
+            this.flushing = this.sendAnswers().finally(() => {
+                this.flushing = null;
             });
+        }
+        return this.flushing;
+    }
 
-            if (response.ok) {
-                const data = await response.json();
-                this.lastAnsweredCharacter = data.character;
-                document.getElementById('undoBtn').style.display = 'block';
-                this.updateProgress();
-                setTimeout(() => {
-                    this.getNextCharacter();
-                    correctBtn.disabled = false;
-                    incorrectBtn.disabled = false;
-                }, 500);
+    async sendAnswers() {
+        let sent = false;
+        while (this.pendingAnswers.length > 0 || this.outbox.length > 0) {
+            if (this.pendingAnswers.length > 0) {
+                this.outbox.push({id: newBatchId(), answers: this.pendingAnswers.splice(0)});
             }
-        } catch (error) {
-            showAlert('Error submitting answer', 'danger');
-            correctBtn.disabled = false;
-            incorrectBtn.disabled = false;
+            const batch = this.outbox[0];
+            if (!(await this.postBatch(batch))) {
+                // Kept with its id, so the next flush retries it without double counting
+                showAlert('Error submitting answers, will retry', 'danger');
+                break;
+            }
+            this.outbox.shift();
+            sent = true;
+        }
+        if (sent) {
+            this.updateProgress();
         }
     }
 
+    async postBatch(batch) {
+        for (let attempt = 1; attempt <= ANSWER_RETRIES; attempt++) {
+            try {
+                const response = await fetch('/answers', {
+                    method: 'POST',
+                    headers: {'Content-Type': 'application/json', 'Idempotency-Key': batch.id},
+                    body: JSON.stringify({answers: batch.answers})
+                });
+                if (response.ok || response.status < 500) {
+                    return true;
+                }
+            } catch (error) {
+                // Network error, retry below
+            }
+            await new Promise(resolve => setTimeout(resolve, 500 * attempt));
+        }
+        return false;
+    }
+
     async updateProgress() {
         try {
             const response = await fetch('/get_progress');
@@ -174,6 +252,8 @@ class KanjiQuiz {
         setLoading(resetBtn, true);
 
         try {
+            await this.flushAnswers();
+            this.cardQueue = [];
             const response = await fetch('/reset_progress', {method: 'POST'});
             
             if (response.ok) {
@@ -199,6 +279,8 @@ class KanjiQuiz {
         undoBtn.disabled = true;
 
         try {
+            // The answer being undone may still be waiting to be sent
+            await this.flushAnswers();
             const response = await fetch('/undo_answer', {
                 method: 'POST',
                 headers: {'Content-Type': 'application/json'},
@@ -218,7 +300,15 @@ class KanjiQuiz {
         }
     }
 
-    showNoMoreCharacters() {
+    showNoMoreCharacters(data = {}) {
+        const text = document.getElementById('noMoreCharsText');
+        if (data.next_review_at) {
+            text.textContent = `No reviews due right now. Next review: ${new Date(data.next_review_at * 1000).toLocaleString()}`;
+        } else if (data.next_review_at === null) {
+            text.textContent = 'No review cards yet. Answer some new characters first.';
+        } else {
+            text.textContent = "No more characters available! You've completed all characters.";
+        }
         document.getElementById('quizInterface').style.display = 'none';
         document.getElementById('noMoreChars').style.display = 'block';
     }
@@ -0,0 +1,49 @@
+import os
+import threading
+from collections import OrderedDict
+
+from metrics import cache_lookup
+
+# /api/stats results kept per worker
+STATS_CACHE_SIZE = int(os.environ.get('STATS_CACHE_SIZE', 1024))
+
+
+class StatsCache:
+    """LRU of computed stats, each stored with the version it was computed at.
+
+    The version comes from the shared progress_versions table, so a write in any
+    worker makes every worker's entry for that user miss on its next read. Entries
+    are replaced rather than added when the version moves on, so one key never
+    holds more than one result. Cached values are shared; callers must not mutate them.
+    """
+
+    def __init__(self, max_entries=STATS_CACHE_SIZE, name='user_stats'):
+        self.max_entries = max_entries
+        self.name = name
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, version):
+        with self._lock:
+            entry = self._entries.get(key)
+            hit = entry is not None and entry[0] == version
+            if hit:
+                self._entries.move_to_end(key)
+        cache_lookup(self.name, hit)
+        return entry[1] if hit else None
+
+    def set(self, key, version, value):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (version, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,23 @@
+import os
+import sys
+
+import pytest
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+
+@pytest.fixture(scope='session')
+def app_module(tmp_path_factory):
+    """app.py on throwaway databases; database.py reads their paths when first imported"""
+    tmp = tmp_path_factory.mktemp('db')
+    os.environ['KANJI_DATABASE'] = str(tmp / 'kanji.db')
+    os.environ['SESSION_DATABASE'] = str(tmp / 'sessions.db')
+    os.environ.setdefault('BCRYPT_ROUNDS', '4')
+    cwd = os.getcwd()
+    os.chdir(APP_DIR)
+    import app
+    import database
+    yield app
+    database.get_pool().close()
+    os.chdir(cwd)
@@ -0,0 +1,62 @@
+import pytest
+
+
+@pytest.fixture
+def client(app_module):
+    client = app_module.app.test_client()
+    client.post('/register', json={'username': 'answers', 'password': 'answers-password'})
+    client.post('/login', json={'username': 'answers', 'password': 'answers-password'})
+    return client
+
+
+@pytest.fixture
+def card(client):
+    return client.post('/start_game', json={'num_chars': 50, 'direction': 'Japanese → English'}).get_json()
+
+
+def shown(client):
+    return client.get('/get_progress').get_json()['shown_characters']
+
+
+@pytest.mark.parametrize('payload', [
+    {'character': None},
+    {'character': '', 'is_correct': True},
+    {'character': 'not a kanji', 'is_correct': True},
+    {'is_correct': 'yes'},
+    {'answer_time_ms': 'abc'},
+    {'answer_time_ms': float('nan')},
+    {'answer_time_ms': float('inf')},
+    {'answer_time_ms': -5},
+    {'answer_time_ms': True},
+])
+def test_invalid_answer_is_rejected(client, card, payload):
+    before = shown(client)
+    payload = {'character': card['character'], 'is_correct': True, **payload}
+    response = client.post('/answer', json={name: value for name, value in payload.items() if value is not None})
+    assert response.status_code == 400
+    assert shown(client) == before
+
+
+def test_invalid_body_is_rejected(client, card):
+    assert client.post('/answer', data='not json', content_type='application/json').status_code == 400
+
+
+def test_valid_answer_is_recorded(client, card):
+    before = shown(client)
+    response = client.post('/answer', json={'character': card['character'], 'is_correct': True, 'answer_time_ms': 1500.5})
+    assert response.status_code == 200
+    assert shown(client) == before + 1
+
+
+def test_failed_progress_write_leaves_quiz_state(app_module, client, card, monkeypatch):
+    before = shown(client)
+    def fail(*args):
+        raise RuntimeError('disk full')
+    monkeypatch.setattr(app_module, 'save_progress', fail)
+    app_module.app.config['PROPAGATE_EXCEPTIONS'] = False
+    try:
+        response = client.post('/answer', json={'character': card['character'], 'is_correct': True})
+    finally:
+        app_module.app.config['PROPAGATE_EXCEPTIONS'] = None
+    assert response.status_code == 500
+    assert shown(client) == before
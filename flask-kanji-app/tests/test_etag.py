@@ -0,0 +1,98 @@
+import gzip
+import json
+from collections import Counter
+
+import pytest
+
+ROUTES = [
+    ('/get_progress', 'progress_summary'),
+    ('/api/stats', 'get_user_stats'),
+    ('/api/stats?session_id=current', 'get_user_stats'),
+    ('/get_user_settings', 'get_user_settings'),
+    ('/search?q=mouth', 'search_results'),
+]
+
+
+def answer_cards(client, count):
+    card = client.get('/get_character').get_json()
+    for n in range(count):
+        # Mostly wrong, so /get_progress lists enough incorrect characters to be worth compressing
+        client.post('/answer', json={'character': card['character'], 'is_correct': n % 4 == 0})
+        card = client.get('/get_character').get_json()
+
+
+@pytest.fixture(scope='module')
+def client(app_module):
+    client = app_module.app.test_client()
+    client.post('/register', json={'username': 'etag', 'password': 'etag-password'})
+    client.post('/login', json={'username': 'etag', 'password': 'etag-password'})
+    client.post('/start_game', json={'num_chars': 2200, 'direction': 'Japanese → English'})
+    answer_cards(client, 100)
+    return client
+
+
+@pytest.fixture
+def calls(app_module, monkeypatch):
+    """Counts calls to the functions that build each route's body"""
+    import database
+    calls = Counter()
+
+    def count(module, name):
+        func = getattr(module, name)
+
+        def counted(*args, **kwargs):
+            calls[name] += 1
+            return func(*args, **kwargs)
+        monkeypatch.setattr(module, name, counted)
+
+    for name in ('progress_summary', 'get_user_stats', 'search_results'):
+        count(app_module, name)
+    count(database, 'get_user_settings')
+    return calls
+
+
+@pytest.mark.parametrize('path, builder', ROUTES)
+def test_matching_etag_skips_the_body(client, calls, path, builder):
+    first = client.get(path)
+    etag = first.headers.get('ETag')
+    assert first.status_code == 200
+    assert etag and etag.startswith('W/')
+    assert first.headers['Cache-Control'] == 'private, no-cache'
+    assert calls[builder] == 1
+
+    response = client.get(path, headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+    assert response.headers['ETag'] == etag
+    assert calls[builder] == 1
+
+
+def test_answer_changes_progress_tags(client):
+    etags = {path: client.get(path).headers['ETag'] for path, _ in ROUTES}
+    answer_cards(client, 1)
+    for path in ('/get_progress', '/api/stats', '/api/stats?session_id=current'):
+        response = client.get(path, headers={'If-None-Match': etags[path]})
+        assert response.status_code == 200, path
+        assert response.headers['ETag'] != etags[path], path
+    for path in ('/get_user_settings', '/search?q=mouth'):
+        assert client.get(path, headers={'If-None-Match': etags[path]}).status_code == 304, path
+
+
+def test_large_json_is_gzipped(app_module, client):
+    plain = client.get('/get_progress')
+    packed = client.get('/get_progress', headers={'Accept-Encoding': 'gzip'})
+    assert len(plain.data) >= app_module.COMPRESS_MIN_BYTES
+    assert packed.headers.get('Content-Encoding') == 'gzip'
+    assert 'Accept-Encoding' in packed.headers['Vary']
+    assert json.loads(gzip.decompress(packed.data)) == plain.get_json()
+
+    small = client.get('/get_user_settings', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in small.headers
+
+
+def test_settings_change_changes_tag(client):
+    etag = client.get('/get_user_settings').headers['ETag']
+    client.post('/start_game', json={'num_chars': 100})
+    response = client.get('/get_user_settings', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.get_json()['saved_num_chars'] == 100
@@ -0,0 +1,27 @@
+import os
+
+import kanji_parser
+import parse_kanji
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+INPUT_FILE = os.path.join(APP_DIR, 'japanese_characters.txt')
+GOLDEN_FILE = os.path.join(APP_DIR, 'kanji_data.csv')
+
+
+def test_parse_kanji_reproduces_golden_csv(tmp_path, monkeypatch):
+    # After an intended format change, regenerate kanji_data.csv with `python parse_kanji.py`
+    monkeypatch.setattr(kanji_parser.cache, 'CACHE_DIR', str(tmp_path / 'cache'))
+    with open(GOLDEN_FILE, 'rb') as f:
+        expected = f.read()
+    # The first run parses the text file, the second reads the deck back from the cache
+    for run in ('parsed', 'cached'):
+        output = tmp_path / f"{run}.csv"
+        parse_kanji.parse_kanji_file(INPUT_FILE, str(output))
+        assert output.read_bytes() == expected, f"{run} deck differs from kanji_data.csv"
+    assert os.listdir(tmp_path / 'cache')
+
+
+def test_parse_file_matches_load_deck(tmp_path):
+    records = kanji_parser.parse_file(INPUT_FILE)
+    assert len(records) == 2200
+    assert tuple(records) == kanji_parser.load_deck(INPUT_FILE, cache_dir=str(tmp_path)).records
@@ -0,0 +1,43 @@
+import os
+
+import pytest
+
+import pdf_export
+
+pytestmark = pytest.mark.skipif(not pdf_export.available(), reason='PDF export requires reportlab')
+
+ROWS = [(n, '一', 'one', n % 2) for n in range(1, 40)]
+
+
+@pytest.fixture
+def exporter(tmp_path, monkeypatch):
+    # Every document goes to disk
+    monkeypatch.setattr(pdf_export, 'PDF_STREAM_ROWS', 1)
+    exporter = pdf_export.PdfExporter(workers=1, cache_dir=str(tmp_path))
+    yield exporter
+    exporter._executor.shutdown()
+
+
+def export(exporter, key):
+    document, future = exporter.get(key, lambda: ROWS)
+    return document if document is not None else future.result()
+
+
+def test_documents_on_disk_count_toward_their_budget(exporter, tmp_path):
+    size = os.path.getsize(export(exporter, ('a', 'jp', 1)))
+    exporter.disk_bytes = size * 2
+    for user in 'bcd':
+        export(exporter, (user, 'jp', 1))
+    assert [key[0] for key in exporter._cache] == ['c', 'd']
+    assert len(os.listdir(tmp_path)) == 2
+
+
+def test_evicted_file_is_rendered_again(exporter):
+    key = ('a', 'jp', 1)
+    path = export(exporter, key)
+    document, _ = exporter.get(key, lambda: ROWS)
+    # Removed between get() and the response opening it
+    os.remove(path)
+    body = b''.join(exporter.iter_document(key, document, lambda: ROWS))
+    assert body.startswith(b'%PDF')
+    assert os.path.exists(path)
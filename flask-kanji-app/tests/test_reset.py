@@ -0,0 +1,17 @@
+def test_reset_clears_the_direction_history(app_module):
+    client = app_module.app.test_client()
+    client.post('/register', json={'username': 'reset', 'password': 'reset-password'})
+    client.post('/login', json={'username': 'reset', 'password': 'reset-password'})
+    for direction, count in (('English → Japanese', 2), ('Japanese → English', 3)):
+        card = client.post('/start_game', json={'num_chars': 50, 'direction': direction}).get_json()
+        for _ in range(count):
+            client.post('/answer', json={'character': card['character'], 'is_correct': True})
+            card = client.get('/get_character').get_json()
+    assert client.get('/api/stats').get_json()['total_answered'] == 5
+
+    # Resets the current quiz's direction, Japanese → English
+    assert client.post('/reset_progress').status_code == 200
+    stats = client.get('/api/stats').get_json()
+    assert stats['total_answered'] == 2
+    assert stats['jp_to_en']['total'] == 0
+    assert sum(day['total'] for day in stats['recent_progress']) == 2
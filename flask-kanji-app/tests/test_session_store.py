@@ -0,0 +1,62 @@
+import threading
+import time
+
+import pytest
+
+from session_store import MemorySessionStore, SqliteSessionStore
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def store(request, tmp_path):
+    if request.param == 'memory':
+        return MemorySessionStore()
+    return SqliteSessionStore(str(tmp_path / 'sessions.db'))
+
+
+def increment(state):
+    state = state or {'count': 0}
+    state['count'] += 1
+    return state, state['count']
+
+
+def test_concurrent_updates_to_one_key_are_not_lost(store):
+    def worker():
+        for _ in range(50):
+            store.update('quiz', increment)
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert store.get('quiz') == {'count': 400}
+
+
+def test_set_and_update_share_the_row(store):
+    store.set('quiz', {'count': 10})
+    assert store.update('quiz', increment) == 11
+    store.delete('quiz')
+    assert store.update('quiz', increment) == 1
+
+
+def test_slow_update_does_not_hold_up_other_keys(tmp_path):
+    store = SqliteSessionStore(str(tmp_path / 'sessions.db'))
+    entered, release = threading.Event(), threading.Event()
+
+    def slow(state):
+        entered.set()
+        release.wait(5)
+        return increment(state)
+    thread = threading.Thread(target=store.update, args=('a', slow))
+    thread.start()
+    entered.wait(5)
+    try:
+        # Waits for nothing: the slow change holds no lock on the database
+        started = time.monotonic()
+        assert store.update('b', increment) == 1
+        assert time.monotonic() - started < 1
+        store.update('a', increment)
+    finally:
+        release.set()
+        thread.join()
+    # The slow change read a stale version, so it ran again on top of the other update
+    assert store.get('a') == {'count': 2}
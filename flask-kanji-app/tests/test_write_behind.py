@@ -0,0 +1,56 @@
+import sqlite3
+
+import pytest
+
+from write_behind import WriteBehindQueue
+
+
+class Store:
+    """flush_func that rejects items of None and can be made to fail like a locked database"""
+
+    def __init__(self):
+        self.rows = []
+        self.locked = False
+
+    def write(self, items):
+        if self.locked:
+            raise sqlite3.OperationalError('database is locked')
+        if any(item[1] is None for item in items):
+            raise sqlite3.IntegrityError('NOT NULL constraint failed')
+        self.rows.extend(items)
+
+
+def make_queue(store):
+    queue = WriteBehindQueue(store.write, batch_size=1000, interval=60, key=lambda item: item[0],
+                             transient=(sqlite3.OperationalError,))
+    return queue
+
+
+def test_bad_item_is_dead_lettered_and_the_rest_are_written():
+    store = Store()
+    queue = make_queue(store)
+    for item in [('a', 1), ('b', None), ('a', 2), ('c', 3)]:
+        queue.put(item)
+
+    assert queue.flush() == 3
+    assert store.rows == [('a', 1), ('a', 2), ('c', 3)]
+    assert len(queue) == 0
+    assert queue.dropped == 1
+    assert queue.dead_letters[0][0] == ('b', None)
+
+
+def test_transient_failure_keeps_items_queued():
+    store = Store()
+    queue = make_queue(store)
+    queue.put(('a', 1))
+    queue.put(('b', 2))
+    store.locked = True
+    with pytest.raises(sqlite3.OperationalError):
+        queue.flush('a')
+    assert len(queue) == 2 and queue.dropped == 0
+
+    store.locked = False
+    assert queue.flush('a') == 1
+    assert store.rows == [('a', 1)]
+    assert queue.flush() == 1
+    assert store.rows == [('a', 1), ('b', 2)]
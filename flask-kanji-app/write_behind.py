@@ -0,0 +1,141 @@
+import atexit
+import os
+import threading
+import time
+from collections import deque
+
+
+class WriteBehindQueue:
+    """Collects writes from request handlers and applies them in batches on a background thread.
+
+    `flush_func(items)` receives the pending items in submission order and must apply
+    them in a single transaction. A flush happens when `batch_size` items are pending,
+    `interval` seconds after the oldest pending item, on `flush()` and at interpreter exit.
+    With `synchronous=True` every `put` flushes before returning.
+
+    With a `key(item)` function, `flush(key)` applies only the items with that key, in
+    order, and leaves the rest queued; items with different keys must be independent.
+
+    When a batch fails with one of the `transient` exceptions it stays queued for the
+    next flush. Any other failure means some item cannot be applied: the batch is
+    retried one item at a time and items that still fail go to `dead_letters`, so a
+    single bad item cannot hold up everything queued behind it.
+    """
+
+    def __init__(self, flush_func, batch_size=100, interval=0.2, synchronous=False, key=None, transient=(),
+                 max_dead_letters=1000):
+        self.flush_func = flush_func
+        self.key = key
+        self.transient = transient
+        self.dead_letters = deque(maxlen=max_dead_letters)
+        self.dropped = 0
+        self.batch_size = batch_size
+        self.interval = interval
+        self.synchronous = synchronous
+        self._pending = []
+        self._oldest = None
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._stopped = False
+        atexit.register(self.close)
+
+    def __len__(self):
+        return len(self._pending)
+
+    def _ensure_thread(self):
+        # Threads do not survive a fork, so each gunicorn worker starts its own flusher
+        if self._thread is None or self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+            self._thread.start()
+
+    def put(self, item):
+        if self.synchronous:
+            with self._flush_lock:
+                self.flush_func([item])
+            return
+        with self._cond:
+            self._ensure_thread()
+            if not self._pending:
+                self._oldest = time.monotonic()
+            self._pending.append(item)
+            # Wake the flusher to arm its timer on the first item, or to flush a full batch
+            if len(self._pending) == 1 or len(self._pending) >= self.batch_size:
+                self._cond.notify()
+
+    def flush(self, key=None):
+        """Apply everything queued so far, or only the items with key, before returning"""
+        with self._flush_lock:
+            with self._cond:
+                if key is None:
+                    items, self._pending = self._pending, []
+                else:
+                    items = [item for item in self._pending if self.key(item) == key]
+                    if items:
+                        self._pending = [item for item in self._pending if self.key(item) != key]
+                if not self._pending:
+                    self._oldest = None
+            if not items:
+                return 0
+            try:
+                self.flush_func(items)
+            except self.transient as e:
+                self._requeue(items, e)
+                raise
+            except Exception as e:
+                print(f"Error flushing {len(items)} queued writes, retrying them one at a time: {e}")
+                return self._flush_each(items)
+            return len(items)
+
+    def _flush_each(self, items):
+        applied = 0
+        for i, item in enumerate(items):
+            try:
+                self.flush_func([item])
+            except self.transient as e:
+                self._requeue(items[i:], e)
+                raise
+            except Exception as e:
+                print(f"Dropping queued write {item!r}: {e}")
+                with self._cond:
+                    self.dead_letters.append((item, repr(e)))
+                    self.dropped += 1
+            else:
+                applied += 1
+        return applied
+
+    def _requeue(self, items, error):
+        print(f"Error flushing {len(items)} queued writes, will retry: {error}")
+        with self._cond:
+            # Keep them ahead of anything queued meanwhile and retry on the next flush
+            self._pending[:0] = items
+            self._oldest = time.monotonic()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopped and len(self._pending) < self.batch_size:
+                    if self._pending:
+                        remaining = self._oldest + self.interval - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._cond.wait(remaining)
+                    else:
+                        self._cond.wait()
+                if self._stopped:
+                    return
+            try:
+                self.flush()
+            except Exception:
+                time.sleep(self.interval)
+
+    def close(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        try:
+            self.flush()
+        except Exception:
+            pass
@@ -1,8 +1,8 @@
 import streamlit as st
 import random
-import json
 import os
-import re
+import sys
+import bisect
 import pandas as pd  # For CSV export
 from io import BytesIO  # For PDF export
 from reportlab.lib.pagesizes import letter  # PDF page size
@@ -11,9 +11,12 @@ from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 import warnings
 
-from login import LoginManager, login_page
+from login import get_login_manager, login_page
 
-login_manager = LoginManager()
+# The record parser lives in the Flask app so both front ends read the deck the same way
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "flask-kanji-app"))
+from kanji_parser import load_deck
+from progress_store import ProgressStore
 
 warnings.filterwarnings("ignore", category=DeprecationWarning)
 txt_file_path = "japanese_characters.txt"  # Path to your text file
@@ -38,41 +41,50 @@ def load_num_rounds(username):
     return None
 
 
+def file_version(path):
+    """(mtime_ns, size) of path, or None if it does not exist; used as a cache key"""
+    try:
+        st_result = os.stat(path)
+    except OSError:
+        return None
+    return (st_result.st_mtime_ns, st_result.st_size)
+
+# Parsed once per file version and shared by every session; reruns only stat the file
+@st.cache_data(show_spinner=False, max_entries=4)
+def parse_character_file(file_path, version):
+    # (character_number, character, meaning), numbered from 1 by line
+    return [(r.number, r.character, r.meaning) for r in load_deck(file_path).records]
+
 # Load the list of Japanese characters and their meanings from the text file
 def load_numbers_from_file(file_path, num_rows):
-    characters = []
     try:
-        with open(file_path, "r", encoding="utf-8") as file:
-            for i, line in enumerate(file):
-                if i >= num_rows:  # Stop after reading num_rows characters
-                    break
-                # Extract the meaning (before the first double quote) and the Japanese character (before "Lesson:")
-                match = re.search(r'^(.+?)\s+"[^"]*\s+([^\s]+)\s+Lesson:', line)
-                if match:
-                    meaning = match.group(1).strip()  # Extract meaning
-                    character = match.group(2).strip()  # Extract character
-                    # Append (character_number, character, meaning)
-                    characters.append((i + 1, character, meaning))  # i+1 to make character number start from 1
+        characters = parse_character_file(file_path, file_version(file_path))
     except Exception as e:
         st.error(f"An error occurred while reading the file: {e}")
-    return characters
+        return []
+    # Only entries from the first num_rows lines, as when reading stopped at num_rows
+    end = bisect.bisect_right([number for number, _, _ in characters], num_rows)
+    return characters[:end]
+
+def progress_file_name(direction, username):
+    return f"{username}-{json_file_path_english_to_japanese}" if direction == "English → Japanese" else f"{username}-{json_file_path_japanese_to_english}"
+
+# One store per progress file, shared by every session so they see each other's answers
+@st.cache_resource
+def progress_store(file_name):
+    return ProgressStore(file_name)
 
-# Load previously selected numbers and their scores from the file (as a dictionary)
+def progress_version(direction, username):
+    """Changes whenever the saved progress for direction changes"""
+    return progress_store(progress_file_name(direction, username)).version()
+
+# Load previously selected numbers and their scores (as a dictionary the caller may modify)
 def load_selected_characters(direction, username):
-    file_name = f"{username}-{json_file_path_english_to_japanese}" if direction == "English → Japanese" else f"{username}-{json_file_path_japanese_to_english}"
-    if os.path.exists(file_name):
-        with open(file_name, "r") as file:
-            selected_characters = json.load(file)
-    else:
-        selected_characters = {}
-    return selected_characters
+    return progress_store(progress_file_name(direction, username)).load()
 
-# Save the selected numbers and their scores back to the file
-def save_selected_characters(direction, selected_characters, username):
-    file_name = f"{username}-{json_file_path_english_to_japanese}" if direction == "English → Japanese" else f"{username}-{json_file_path_japanese_to_english}"
-    print(selected_characters)
-    with open(file_name, "w") as file:
-        json.dump(selected_characters, file)
+# Append one answer to the progress journal
+def save_answer(direction, char, score, username):
+    progress_store(progress_file_name(direction, username)).record(char, score)
 
 # Get a random character without selecting previously chosen ones
 def select_random_character(available_characters, selected_characters):
@@ -105,43 +117,57 @@ def reset_progress(username):
     st.session_state.selected_characters = {}
     st.session_state.show_character_input = True  # Show character input after reset
     st.session_state.available_characters = []  # Clear available characters
-    save_selected_characters(st.session_state.quiz_direction, st.session_state.selected_characters, username)
+    progress_store(progress_file_name(st.session_state.quiz_direction, username)).clear()
     st.session_state.num_chars = None
     st.session_state.game_started = False
     if os.path.exists(NUM_ROUNDS_FILE):
         os.remove(NUM_ROUNDS_FILE)
 
+# Exports are cached per (username, direction, deck, progress version); the underscore
+# arguments are not hashed, the version arguments already identify their contents
+def export_key(username):
+    return (username, st.session_state.quiz_direction, st.session_state.num_chars,
+            file_version(txt_file_path), progress_version(st.session_state.quiz_direction, username))
+
 # Generate CSV for download
-def generate_csv():
+@st.cache_data(show_spinner=False, max_entries=32)
+def generate_csv(key, _available_characters, _selected_characters):
     data = []
-    for char_number, char, meaning in st.session_state.available_characters:
-        if char in st.session_state.selected_characters:
-            status = "Correct" if st.session_state.selected_characters[char] == 1 else "Incorrect"
+    for char_number, char, meaning in _available_characters:
+        if char in _selected_characters:
+            status = "Correct" if _selected_characters[char] == 1 else "Incorrect"
             data.append([char_number, char, meaning, status])
     df = pd.DataFrame(data, columns=["Character Number", "Character", "Meaning", "Status"])
     return df.to_csv(index=False).encode('utf-8')
 
+# Fonts only need registering once per process
+@st.cache_resource
+def register_pdf_font():
+    pdfmetrics.registerFont(TTFont("Noto Sans JP Thin", "NOTOSANSJP-THIN.TTF"))
+    return "Noto Sans JP Thin"
+
 # Generate PDF for download
-def generate_pdf():
+@st.cache_data(show_spinner=False, max_entries=32)
+def generate_pdf(key, _available_characters, _selected_characters):
+    font = register_pdf_font()
     buffer = BytesIO()
     pdf = canvas.Canvas(buffer, pagesize=letter)
-    pdfmetrics.registerFont(TTFont("Noto Sans JP Thin", "NOTOSANSJP-THIN.TTF"))
-    pdf.setFont("Noto Sans JP Thin", 14)
+    pdf.setFont(font, 14)
     pdf.drawString(100, 750, "Japanese Characters and Meanings")
     
     y_position = 720
-    for char_number, char, meaning in st.session_state.available_characters:
-        if char in st.session_state.selected_characters:
-            status = "Correct" if st.session_state.selected_characters[char] == 1 else "Incorrect"
+    for char_number, char, meaning in _available_characters:
+        if char in _selected_characters:
+            status = "Correct" if _selected_characters[char] == 1 else "Incorrect"
             pdf.drawString(100, y_position, f"({int(char_number):6}) {char:<6}: {meaning:<50} - {status}")
             y_position -= 20
             if y_position < 40:  # Create a new page if space runs out
                 pdf.showPage()
+                pdf.setFont(font, 14)
                 y_position = 750
 
     pdf.save()
-    buffer.seek(0)
-    return buffer
+    return buffer.getvalue()
 
 # Streamlit app
 def main(username):
@@ -207,7 +233,7 @@ def main(username):
             with col1:
                 if st.button("Correct"):
                     st.session_state.selected_characters[char] = 1  # Mark as correct (1)
-                    save_selected_characters(st.session_state.quiz_direction, st.session_state.selected_characters, username=username)
+                    save_answer(st.session_state.quiz_direction, char, 1, username=username)
                     update_character()  # Update the character immediately
                     char_number, char = st.session_state.selected
                     meaning = st.session_state.meaning
@@ -215,7 +241,7 @@ def main(username):
             with col2:
                 if st.button("Incorrect"):
                     st.session_state.selected_characters[char] = 0  # Mark as incorrect (0)
-                    save_selected_characters(st.session_state.quiz_direction, st.session_state.selected_characters, username=username)
+                    save_answer(st.session_state.quiz_direction, char, 0, username=username)
                     update_character()  # Update the character immediately
                     char_number, char = st.session_state.selected
                     meaning = st.session_state.meaning
@@ -255,29 +281,36 @@ def main(username):
         # Display incorrect characters and their meanings
         incorrect_characters = [char for char, score in st.session_state.selected_characters.items() if score == 0]
         if incorrect_characters:
+            meanings = {c: m for _, c, m in st.session_state.available_characters}
             st.sidebar.write("Incorrect Characters:")
             for char in incorrect_characters:
-                meaning = next((m for _, c, m in st.session_state.available_characters if c == char), "No meaning found")
-                st.sidebar.write(f"{char}: {meaning}")
+                st.sidebar.write(f"{char}: {meanings.get(char, 'No meaning found')}")
 
-        # Download buttons for CSV and PDF exports
+        # Exports are only built once asked for, then served from the cache until progress changes
+        key = export_key(username)
         col1, col2 = st.columns(2)
         with col1:
-            csv_data = generate_csv()
-            st.download_button(
-                label="Download as CSV",
-                data=csv_data,
-                file_name=f"{username}-japanese_characters.csv",
-                mime='text/csv'
-            )
+            if st.session_state.get('export_csv_key') == key:
+                st.download_button(
+                    label="Download as CSV",
+                    data=generate_csv(key, st.session_state.available_characters, st.session_state.selected_characters),
+                    file_name=f"{username}-japanese_characters.csv",
+                    mime='text/csv'
+                )
+            elif st.button("Prepare CSV"):
+                st.session_state.export_csv_key = key
+                st.rerun()
         with col2:
-            pdf_data = generate_pdf()
-            st.download_button(
-                label="Download as PDF",
-                data=pdf_data,
-                file_name=f"{username}-japanese_characters.pdf",
-                mime="application/pdf"
-            )
+            if st.session_state.get('export_pdf_key') == key:
+                st.download_button(
+                    label="Download as PDF",
+                    data=generate_pdf(key, st.session_state.available_characters, st.session_state.selected_characters),
+                    file_name=f"{username}-japanese_characters.pdf",
+                    mime="application/pdf"
+                )
+            elif st.button("Prepare PDF"):
+                st.session_state.export_pdf_key = key
+                st.rerun()
 
 if "authenticated" not in st.session_state:
     st.session_state.authenticated = False
@@ -285,4 +318,4 @@ if "authenticated" not in st.session_state:
 if st.session_state.authenticated:
     main(st.session_state.username)
 else:
-    login_page(login_manager)
\ No newline at end of file
+    login_page(get_login_manager())
\ No newline at end of file
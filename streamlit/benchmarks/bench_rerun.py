@@ -0,0 +1,93 @@
+"""Per-rerun latency of the quiz page as Streamlit's test harness runs it.
+
+Run from streamlit/:  python benchmarks/bench_rerun.py [--app app.py] [--reruns 50] [--chars 2200]
+Against the previous version:
+    git show HEAD~1:streamlit/app.py > /tmp/app_old.py && python benchmarks/bench_rerun.py --app /tmp/app_old.py
+
+The PDF export needs NOTOSANSJP-THIN.TTF next to app.py; without it the PDF timings are skipped.
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SUPPORT_FILES = ["login.py", "progress_store.py", "user_store.py", "japanese_characters.txt", "NOTOSANSJP-THIN.TTF"]
+
+_reported = set()
+
+
+def report(label, timings):
+    timings = sorted(timings)
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    print(f"  {label:<24} mean {statistics.mean(timings) * 1000:8.1f} ms"
+          f"   p50 {statistics.median(timings) * 1000:8.1f} ms   p95 {p95 * 1000:8.1f} ms")
+
+
+def timed_run(action):
+    start = time.perf_counter()
+    at = action()
+    elapsed = time.perf_counter() - start
+    if at.exception and at.exception[0].message not in _reported:
+        # Still timed: the script ran up to the failure, as it would for a user
+        _reported.add(at.exception[0].message)
+        print(f"  script raised: {at.exception[0].message.splitlines()[0]}", file=sys.stderr)
+    return elapsed
+
+
+def button(at, label):
+    return next((b for b in at.button if b.label == label), None)
+
+
+def run(reruns):
+    st.cache_data.clear()
+    st.cache_resource.clear()
+    at = AppTest.from_file("app.py", default_timeout=120)
+    at.session_state["authenticated"] = True
+    at.session_state["username"] = "bench"
+
+    report("first run", [timed_run(at.run)])
+    report("idle rerun", [timed_run(at.run) for _ in range(reruns)])
+    report("answer (Correct)", [timed_run(lambda: button(at, "Correct").click().run()) for _ in range(reruns)])
+
+    # The cached version builds exports behind a Prepare button, the old one on every rerun
+    if button(at, "Prepare CSV") is not None:
+        report("prepare CSV", [timed_run(lambda: button(at, "Prepare CSV").click().run())])
+        report("rerun with CSV ready", [timed_run(at.run) for _ in range(reruns)])
+        if os.path.exists("NOTOSANSJP-THIN.TTF"):
+            report("prepare PDF", [timed_run(lambda: button(at, "Prepare PDF").click().run())])
+            report("rerun with PDF ready", [timed_run(at.run) for _ in range(reruns)])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--app", default=os.path.join(HERE, "app.py"))
+    parser.add_argument("--reruns", type=int, default=50)
+    parser.add_argument("--chars", type=int, default=2200)
+    args = parser.parse_args()
+
+    app_path = os.path.abspath(args.app)
+    with tempfile.TemporaryDirectory() as tmp:
+        # The app reads and writes its files relative to the working directory
+        shutil.copy(app_path, os.path.join(tmp, "app.py"))
+        for name in SUPPORT_FILES:
+            if os.path.exists(os.path.join(HERE, name)):
+                shutil.copy(os.path.join(HERE, name), tmp)
+        with open(os.path.join(tmp, "bench-num_rounds.txt"), "w") as f:
+            f.write(str(args.chars))
+        os.chdir(tmp)
+        sys.path.insert(0, tmp)
+        # The copied app.py cannot find kanji_parser relative to itself
+        sys.path.append(os.path.join(HERE, "..", "flask-kanji-app"))
+        print(f"{app_path} ({args.chars} characters, {args.reruns} reruns):")
+        run(args.reruns)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,53 +1,47 @@
 # login.py
 import streamlit as st
-import hashlib
-import json
 import os
 
+from user_store import UserStore, hash_secret, verify_secret
+
+# Imported into the user store the first time it is opened empty
 USER_FILE = "users.json"
 
 class LoginManager:
-    def __init__(self):
-        self.users = self.load_users()
-
-    def load_users(self):
-        if os.path.exists(USER_FILE):
-            with open(USER_FILE, "r") as f:
-                return json.load(f)
-        return {}
-
-    def save_users(self):
-        with open(USER_FILE, "w") as f:
-            json.dump(self.users, f, indent=4)
-
-    def hash_text(self, text):
-        return hashlib.sha256(text.encode()).hexdigest()
+    def __init__(self, store=None):
+        self.store = store or UserStore()
+        if self.store.is_empty() and os.path.exists(USER_FILE):
+            self.store.import_users_json(USER_FILE)
 
     def check_login(self, username, password):
-        return username in self.users and self.users[username]["password"] == self.hash_text(password)
-
-    def sign_up(self, username, password, security_question, security_answer):
-        if username in self.users:
+        user = self.store.get(username)
+        if user is None or not verify_secret(password, user[0]):
             return False
-        self.users[username] = {
-            "password": self.hash_text(password),
-            "security_question": security_question,
-            "security_answer": self.hash_text(security_answer)
-        }
-        self.save_users()
+        if not user[0].startswith("$2"):
+            # Upgrade a sha256 hash from users.json now that we know the password
+            self.store.set_password_hash(username, hash_secret(password))
         return True
 
+    def sign_up(self, username, password, security_question, security_answer):
+        return self.store.add(username, hash_secret(password), security_question, hash_secret(security_answer))
+
     def reset_password(self, username, security_question, security_answer, new_password):
+        user = self.store.get(username)
         if (
-            username in self.users and
-            self.users[username]["security_question"] == security_question and
-            self.users[username]["security_answer"] == self.hash_text(security_answer)
+            user is not None and
+            user[1] == security_question and
+            user[2] is not None and
+            verify_secret(security_answer, user[2])
         ):
-            self.users[username]["password"] = self.hash_text(new_password)
-            self.save_users()
+            self.store.set_password_hash(username, hash_secret(new_password))
             return True
         return False
 
+# One manager (and user store) per process, shared by every session
+@st.cache_resource
+def get_login_manager():
+    return LoginManager()
+
 def login_page(login_manager):
     st.title("Login / Sign Up / Forgot Password")
     choice = st.radio("Choose an option:", ["Login", "Sign Up", "Forgot Password"])
@@ -0,0 +1,122 @@
+import json
+import os
+import threading
+
+# Journal records written before the journal is folded into the snapshot
+COMPACT_EVERY = 500
+
+
+class ProgressStore:
+    """Progress for one user and direction: a JSON snapshot plus an append-only journal.
+
+    The snapshot is the `{username}-selected_characters_*.json` file the app always
+    wrote, so existing files load unchanged. Each answer appends one line to
+    `<snapshot>.journal`: `["字", 1]` sets a score and `null` clears everything.
+    Replaying a record twice gives the same state, so a crash between replacing the
+    snapshot and truncating the journal loses nothing.
+    """
+
+    def __init__(self, path, compact_every=COMPACT_EVERY):
+        self.path = path
+        self.journal_path = path + ".journal"
+        self.compact_every = compact_every
+        self._state = {}
+        self._records = 0
+        self._version = None
+        self._lock = threading.Lock()
+
+    def _stat(self, path):
+        try:
+            st_result = os.stat(path)
+        except OSError:
+            return None
+        return (st_result.st_ino, st_result.st_mtime_ns, st_result.st_size)
+
+    def version(self):
+        """Changes whenever the snapshot or journal changes, including from another process"""
+        return (self._stat(self.path), self._stat(self.journal_path))
+
+    def _apply(self, state, record):
+        if record is None:
+            return {}
+        state[record[0]] = record[1]
+        return state
+
+    def _read(self):
+        state = {}
+        if os.path.exists(self.path):
+            with open(self.path, "r") as file:
+                state = json.load(file)
+
+        records = 0
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, "rb") as journal:
+                content = journal.read()
+            good_end = 0
+            for line in content.splitlines(keepends=True):
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("incomplete record")
+                    record = json.loads(line)
+                except ValueError:
+                    break  # A torn write from a crash; everything after it is dropped
+                state = self._apply(state, record)
+                records += 1
+                good_end += len(line)
+            if good_end < len(content):
+                # Cut the torn tail so the next append starts on a fresh line
+                with open(self.journal_path, "r+b") as journal:
+                    journal.truncate(good_end)
+
+        self._state = state
+        self._records = records
+        self._version = self.version()
+
+    def _sync(self):
+        if self._version is None or self.version() != self._version:
+            self._read()
+
+    def load(self):
+        with self._lock:
+            self._sync()
+            return dict(self._state)
+
+    def _append(self, record):
+        self._sync()
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+        with open(self.journal_path, "ab") as journal:
+            journal.write(line.encode("utf-8"))
+            journal.flush()
+            os.fsync(journal.fileno())
+        self._state = self._apply(self._state, record)
+        self._records += 1
+        if self._records >= self.compact_every:
+            self._compact()
+        self._version = self.version()
+
+    def record(self, character, score):
+        with self._lock:
+            self._append([character, score])
+
+    def clear(self):
+        with self._lock:
+            self._append(None)
+
+    def _compact(self):
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(self._state, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, self.path)
+        # The snapshot now holds every journal record; replaying them again would be harmless
+        with open(self.journal_path, "wb"):
+            pass
+        self._records = 0
+
+    def compact(self):
+        """Fold the journal into the snapshot now"""
+        with self._lock:
+            self._sync()
+            self._compact()
+            self._version = self.version()
@@ -0,0 +1,99 @@
+import json
+import os
+import sqlite3
+import sys
+import threading
+
+import bcrypt
+
+# Password checks are shared with the Flask app so the two cannot accept different hashes
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "flask-kanji-app"))
+from password_hashing import check_password as verify_secret
+
+# Point this at flask-kanji-app/kanji.db to share accounts with the Flask app
+USER_DATABASE = os.environ.get('USER_DATABASE', 'users.db')
+
+
+def hash_secret(text):
+    return bcrypt.hashpw(text.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+
+
+class UserStore:
+    """Accounts in SQLite, using the users table of flask-kanji-app/database.py.
+
+    Every lookup and write touches a single row by primary key. Connections are
+    per thread, so one instance can be shared by all Streamlit sessions.
+    """
+
+    def __init__(self, path=USER_DATABASE):
+        self.path = path
+        self._local = threading.local()
+        conn = self._connect()
+        with conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS users (
+                    username TEXT PRIMARY KEY,
+                    password_hash TEXT NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            # The Flask app creates users without these, so add them to an existing table
+            columns = [row[1] for row in conn.execute('PRAGMA table_info(users)')]
+            if 'security_question' not in columns:
+                conn.execute('ALTER TABLE users ADD COLUMN security_question TEXT')
+            if 'security_answer_hash' not in columns:
+                conn.execute('ALTER TABLE users ADD COLUMN security_answer_hash TEXT')
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def is_empty(self):
+        return self._connect().execute('SELECT 1 FROM users LIMIT 1').fetchone() is None
+
+    def get(self, username):
+        """(password_hash, security_question, security_answer_hash) or None"""
+        return self._connect().execute(
+            'SELECT password_hash, security_question, security_answer_hash FROM users WHERE username = ?',
+            (username,)).fetchone()
+
+    def add(self, username, password_hash, security_question=None, security_answer_hash=None):
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute('''INSERT INTO users (username, password_hash, security_question, security_answer_hash)
+                                VALUES (?, ?, ?, ?)''',
+                             (username, password_hash, security_question, security_answer_hash))
+            return True
+        except sqlite3.IntegrityError:
+            return False
+
+    def set_password_hash(self, username, password_hash):
+        conn = self._connect()
+        with conn:
+            conn.execute('UPDATE users SET password_hash = ? WHERE username = ?', (password_hash, username))
+
+    def import_users_json(self, path):
+        """Copy accounts from a users.json written by the old LoginManager; existing usernames are kept"""
+        with open(path, 'r') as f:
+            users = json.load(f)
+        rows = [(username, user['password'], user.get('security_question'), user.get('security_answer'))
+                for username, user in users.items() if isinstance(user, dict)]
+        conn = self._connect()
+        with conn:
+            before = conn.total_changes
+            conn.executemany('''INSERT OR IGNORE INTO users (username, password_hash, security_question, security_answer_hash)
+                                VALUES (?, ?, ?, ?)''', rows)
+            return conn.total_changes - before
+
+
+if __name__ == '__main__':
+    # python user_store.py [users.json]  imports into USER_DATABASE
+    source = sys.argv[1] if len(sys.argv) > 1 else 'users.json'
+    imported = UserStore().import_users_json(source)
+    print(f"Imported {imported} users from {source} into {USER_DATABASE}")